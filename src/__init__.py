@@ -6,354 +6,110 @@ Wadoku license information is available on the web:
 
 http://www.wadoku.de/wiki/display/WAD/Wörterbuch+Lizenz
 http://www.wadoku.de/wiki/display/WAD/%28Vorschlag%29+Neue+Wadoku-Daten+Lizenz
+
+Only the menu entries and the editor hook are set up on start up. The
+modules doing the actual work (and the pitch accent dictionaries) are
+loaded on first use.
 """
 
 __author__ = "Tarek Saier"
 __credits__ = ["kclisp", "Peter Maxwell"]
 __license__ = "MIT"
 
-import json
-import os
-import re
 import sys
 from aqt import mw, gui_hooks
-from aqt.utils import showInfo, showText, getText
-from aqt.qt import QMenu
-from textwrap import dedent
-from ._version import __version__
-from ._constants import re_all_hira_patt
-from .util import (
-    add_pitch,
-    remove_pitch,
-    get_accent_dict,
-    get_note_type_ids,
-    get_note_ids,
-    get_user_accent_dict,
-    select_deck_id,
-    select_note_type_id,
-    select_note_fields_add,
-    select_note_fields_del,
-    get_plugin_dir_path,
-    get_acc_patt,
-    add_pitch_to_field_content,
-    clean_japanese_from_note_field,
-)
-from .draw_pitch import pitch_svg
-from .types import HiraganaStr
-
-
-def about_dialog() -> None:
-    """Popup displaying information about the add-on."""
-
-    contrib: str = "<br>".join(__credits__)
-    gh_link: str = "https://github.com/IllDepence/anki_add_pitch_plugin"
-    aw_link: str = "https://ankiweb.net/shared/info/148002038"
-    license_link: str = gh_link + "/blob/master/LICENSE"
-
-    info_text: str = f"""\
-        <center>
-        <h3>Japanese Pitch Accent</h3>
-        <p><b>Version</b><br>{__version__}</p>
-        <p>
-            <b>License</b><br>
-            <a href="{license_link}">{__license__}</a>
-        </p>
-        <p><b>Maintainer</b><br>{__author__}</p>
-        <p><b>Contributors</b><br>{contrib}</p>
-        <p>
-            <a href="{gh_link}">GitHub</a>
-            &nbsp;<b>&middot;</b>&nbsp;
-            <a href="{aw_link}">AnkiWeb</a>
-        </p>
-        </center>"""
-
-    showText(
-        dedent(info_text),
-        title="About",
-        type="html",
-        minWidth=200,
-        minHeight=340,
-    )
-
-
-def add_pitch_dialog() -> None:
-    """Dialog for bulk adding pitch accent illustrations to notes."""
-
-    # load pitch dict
-    acc_dict = get_accent_dict()
-
-    # load user pitch dict if present
-    acc_dict.update(get_user_accent_dict())
-
-    # figure out collection structure
-    deck_id = select_deck_id("Which deck would you like to extend?")
-    if deck_id is None:
-        return
-    note_type_ids = get_note_type_ids(deck_id)
-    if len(note_type_ids) > 1:
-        note_type_id = select_note_type_id(note_type_ids)
-    elif len(note_type_ids) < 1:
-        showInfo("No cards found in deck.")
-        return
-    else:
-        note_type_id = note_type_ids[0]
-    if note_type_id is None:
-        return
-    note_ids = get_note_ids(deck_id, note_type_id)
-    if len(note_ids) == 0:
-        showInfo("No cards found for selected note type.")
-        return
-    expr_idx, rdng_idx, out_idx = select_note_fields_add(note_type_id)
-    if expr_idx is None or rdng_idx is None or out_idx is None:
-        return
+from aqt.qt import QMenu, QTimer
+
 
-    # extend notes
-    nf_lst, n_updt, n_adone, n_sfail = add_pitch(
-        acc_dict, note_ids, expr_idx, rdng_idx, out_idx
-    )
-    report_text = f"""\
-        done :)
-        skipped {n_adone} already annotated notes
-        updated {n_updt} notes
-        failed to generate {n_sfail} annotations
-        could not find {len(nf_lst)} expressions"""
-    showInfo(dedent(report_text), title="Bulk add results")
-
-
-def add_user_pitch_dialog():
-    """Popup explaining how to manually set pitch accent illustrations."""
-
-    icon_img = (
-        "data:image/svg+xml;base64,PHN2ZwogICB2aWV3Qm94PSIwIDAgMjIuNSAyMi41Igo"
-        "gICBoZWlnaHQ9IjIyLjUiCiAgIHdpZHRoPSIyMi41IgogICBjbGFzcz0icGl0Y2giPgog"
-        "IDxwYXRoCiAgICAgaWQ9InBhdGg4NTIiCiAgICAgc3R5bGU9ImZpbGw6bm9uZTtzdHJva"
-        "2U6IzAwMDAwMDtzdHJva2Utd2lkdGg6MS41IgogICAgIGQ9Ik0gMi41LDE3LjUgMjAsNS"
-        "IgLz4KICA8Y2lyY2xlCiAgICAgaWQ9ImNpcmNsZTg1NCIKICAgICBzdHlsZT0ib3BhY2l"
-        "0eToxO2ZpbGw6IzAwMDAwMDtzdHJva2Utd2lkdGg6MSIKICAgICBjeT0iMTcuNSIKICAg"
-        "ICBjeD0iMi41IgogICAgIHI9IjIuNSIgLz4KICA8Y2lyY2xlCiAgICAgaWQ9ImNpcmNsZ"
-        "Tg1NiIKICAgICBzdHlsZT0ib3BhY2l0eToxO2ZpbGw6IzAwMDAwMDtzdHJva2Utd2lkdG"
-        "g6MSIKICAgICBjeT0iNSIKICAgICBjeD0iMjAiCiAgICAgcj0iMi41IiAvPgogIDxjaXJ"
-        "jbGUKICAgICBpZD0iY2lyY2xlODU4IgogICAgIHN0eWxlPSJvcGFjaXR5OjE7ZmlsbDoj"
-        "ZmZmZmZmO3N0cm9rZS13aWR0aDoxIgogICAgIGN5PSI1IgogICAgIGN4PSIyMCIKICAgI"
-        "CByPSIxLjYyNSIgLz4KPC9zdmc+Cg=="
-    )
-
-    info_text = f"""\
-        <p>
-            When adding or editing cards, click the pitch accent icon located
-            on the right hand side of the text formatting buttons to manually
-            insert, overwrite, or remove the pitch accent.<br>
-        </p>
-        <table>
-            <tr>
-            <td align="left" valign="middle">
-                <img src="{icon_img}">
-            </td>
-            <td valign="middle" align="center">
-                &nbsp;&larr; icon to look for
-            </td>
-            </tr>
-        </table>"""
-
-    showInfo(dedent(info_text), title="Manually add/edit/remove", textFormat="rich")
-
-
-def show_custom_db_path_dialog():
-    """Popup explaining the user custom dictionary."""
-
-    user_pitch_csv_path = os.path.join(get_plugin_dir_path(), "user_pitchdb.csv")
-
-    custom_db_text = f"""\
-        <p>You can extend and overwrite pitch accent patterns using the
-        file <code>{user_pitch_csv_path}</code>. The file has to be three
-        columns (expression, reading, pitch accent pattern) separated by
-        <kbd>TAB</kbd> characters.</p>"""
-    showInfo(dedent(custom_db_text), title="Custom DB path", textFormat="rich")
-
-
-def remove_user_pitch_dialog():
-    """Dialog for bulk removing user added custom pitch accent
-    illustrations from nodes.
+def run_dialog(name):
+    """Return a menu callback that runs the dialog function of the given
+    name, importing the dialogs module on first use.
     """
 
-    return remove_pitch_dialog(user_set=True)
+    def callback():
+        from . import dialogs
 
+        getattr(dialogs, name)()
 
-def remove_pitch_dialog(user_set=False):
-    """Dialog for bulk removing pitch accent illustrations from nodes."""
+    return callback
 
-    # figure out collection structure
-    deck_id = select_deck_id("From which deck would you like to remove?")
-    if deck_id is None:
-        return
-    note_type_ids = get_note_type_ids(deck_id)
-    if len(note_type_ids) > 1:
-        note_type_id = select_note_type_id(note_type_ids)
-    elif len(note_type_ids) < 1:
-        showInfo("No cards found in deck.")
-        return
-    else:
-        note_type_id = note_type_ids[0]
-    if note_type_id is None:
-        return
-    note_ids = get_note_ids(deck_id, note_type_id)
-    if len(note_ids) == 0:
-        showInfo("No cards found for selected note type.")
-        return
-    del_idx = select_note_fields_del(note_type_id)
-    if del_idx is None:
-        return
 
-    # remove from notes
-    n_adone, n_updt = remove_pitch(note_ids, del_idx, user_set)
-    report_text = f"""\
-        done :)
-        skipped {n_adone} notes w/o accent annotation
-        updated {n_updt} notes"""
-    showInfo(dedent(report_text), title="Bulk remove results")
+def add_set_pitch_buttons(buttons, editor):
+    """Add pitch buttons to editor menu."""
 
+    from .editor import add_set_pitch_buttons
 
-def set_pitch_manually_dialog(editor):
-    """Dialog for manually setting the pitch accent illustration
-    in the currently selected editor field.
-    """
+    add_set_pitch_buttons(buttons, editor)
 
-    if editor.web.editor.currentField is None:
-        showInfo("A field needs to be selected")
-        return
 
-    # get user input
-    hira, hira_succeeded = getText("Enter the reading to be set.\nExample: はな")
-    if not hira_succeeded:
-        return
+def add_browser_menu(browser):
+    """Add pitch accent actions for the selected notes to the browser."""
 
-    LH_patt, LH_patt_succeeded = getText(
-        "Enter the pitch accent pattern as a sequence of 'H's and 'L's.\nExample: LHL"
-    )
-    if not LH_patt_succeeded:
-        return
+    from .browser import add_browser_menu
 
-    set_pitch(editor, hira, LH_patt)
+    add_browser_menu(browser)
 
 
-def set_pitch_automatically(editor):
-    """Automatically set the pitch accent illustration
-    in the currently selected editor field.
-    """
+def start_lookup_service():
+    """Start the local lookup service if enabled in the config."""
 
-    # try to determine note fields
-    expr_guess = None
-    reading_guess = None
-    for fld, val_unesc in editor.note.items():
-        val = editor.mw.col.media.escapeImages(val_unesc)
-        ja_expr = clean_japanese_from_note_field(val)
-        if ja_expr is None:
-            # no Japanese, next
-            continue
-        if expr_guess is None:
-            # assume expression field comes before others,
-            # so only set once (and don’t overwrite later
-            # with content that might be in subsequent fields)
-            expr_guess = ja_expr
-        all_hira_match = re_all_hira_patt.search(ja_expr)
-        if all_hira_match and reading_guess is None:
-            # if first continuous block is all hiragana, treat as reading
-            # and don’t override afterwards
-            reading_guess = HiraganaStr(all_hira_match.group(0))
-        if expr_guess is not None and reading_guess is not None:
-            # found all that we needed
-            break
-    if expr_guess is None:
-        showInfo("Could not identify expression", title="Card parsing failure")
+    config = mw.addonManager.getConfig(__name__) or {}
+    if not config.get("lookup_service", False):
         return
-    if reading_guess is None:
-        # could imagine user that just does expr to meaning (with no
-        # field for reading) and then wants to add pitch accent illustrations
-        reading_guess = HiraganaStr("")
-
-    # load pitch dict
-    acc_dict = get_accent_dict()
-    # load user pitch dict if present
-    acc_dict.update(get_user_accent_dict())
-    patt = get_acc_patt(expr_guess, reading_guess, [acc_dict])
-    if not patt:
-        showInfo(
-            f"Could not find pitch for expression “{expr_guess}”",
-            title="Card parsing failure",
-        )
-        return
-    hira, LlHh_patt = patt
-    LH_patt = re.sub(r"[lh]", "", LlHh_patt)
 
-    set_pitch(editor, hira, LH_patt)
+    from .service import start_service
+
+    port = config.get("lookup_service_port", 8767)
+    try:
+        start_service(port)
+    except OSError as e:
+        from aqt.utils import showWarning
+
+        showWarning(f"Could not start pitch accent lookup service on port {port}: {e}")
+
+
+def stop_lookup_service():
+    """Stop the local lookup service, if it was started."""
+
+    service = sys.modules.get(f"{__name__}.service")
+    if service is not None:
+        service.stop_service()
 
 
-def set_pitch(editor, hira, LH_patt):
-    """Set the pitch accent illustration in the editor’s current
-    selected field according to the hiragana and low-high pattern
-    given.
+def release_idle_dicts():
+    """Release the pitch accent dictionaries if they were not used for
+    the configured time, or earlier if Anki uses more memory than
+    configured.
     """
 
-    # get note data
-    data = [
-        (fld, editor.mw.col.media.escapeImages(val)) for fld, val in editor.note.items()
-    ]
-
-    # remove existing patt
-    acc_patt = re.compile(
-        r"<!-- (user_)?accent_start -->.+<!-- (user_)?accent_end -->", re.S
-    )
-    old_field_val = data[editor.web.editor.currentField][1]
-    old_field_val_clean = re.sub(acc_patt, "", old_field_val)
-
-    # generate SVG
-    svg = pitch_svg(hira, LH_patt)
-    # add pitch to field
-    new_field_val = add_pitch_to_field_content(old_field_val_clean, svg, True)
-    if hira == "" and LH_patt == "":
-        new_field_val = old_field_val_clean
-
-    # add new patt
-    data[editor.web.editor.currentField] = (
-        data[editor.web.editor.currentField][0],  # leave field name as is
-        new_field_val,  # update field value
-    )
-    js = "setFields(%s); setFonts(%s); focusField(%s); setNoteId(%s)" % (
-        json.dumps(data),
-        json.dumps(editor.fonts()),
-        json.dumps(editor.web.editor.currentField),
-        json.dumps(editor.note.id),
-    )
-    js = gui_hooks.editor_will_load_note(js, editor.note, editor)
-    editor.web.eval(js)
+    util = sys.modules.get(f"{__name__}.util")
+    if util is None:
+        # nothing loaded yet
+        return
+    config = mw.addonManager.getConfig(__name__) or {}
+    max_rss_mb = config.get("dict_release_memory_mb", 1500)
+    if max_rss_mb > 0 and util.release_accent_dicts_under_pressure(
+        max_rss_mb * 1024 * 1024
+    ):
+        return
+    idle_minutes = config.get("dict_idle_release_minutes", 30)
+    if idle_minutes > 0:
+        util.release_idle_accent_dicts(idle_minutes * 60)
 
 
-def add_set_pitch_buttons(buttons, editor):
-    """Add pitch buttons to editor menu."""
+def release_dicts():
+    """Release the pitch accent dictionaries, if loaded."""
 
-    # manual mode
-    icon_path_m = os.path.join(get_plugin_dir_path(), "icon_manual.png")
-    m_btn = editor.addButton(
-        icon_path_m,
-        "manualpitch",
-        set_pitch_manually_dialog,
-        tip="set pitch accent manually",
-    )
-    buttons.append(m_btn)
-    # auto mode
-    icon_path_a = os.path.join(get_plugin_dir_path(), "icon_auto.png")
-    a_btn = editor.addButton(
-        icon_path_a,
-        "autopitch",
-        set_pitch_automatically,
-        tip="set pitch accent automatically",
-    )
-    buttons.append(a_btn)
+    util = sys.modules.get(f"{__name__}.util")
+    if util is not None:
+        util.release_accent_dicts()
 
 
 def pre_load_pitch_data(col):
     """Pre-load pitch accent dictionaries (will get cached)"""
 
+    from .util import get_accent_dict, get_user_accent_dict
+
     _ = get_accent_dict()
     _ = get_user_accent_dict()
 
@@ -364,29 +120,47 @@ def pre_load_pitch_data(col):
 pa_menu = QMenu("Pitch Accent", mw)
 pa_menu_add = pa_menu.addAction("bulk add")
 pa_menu_remove = pa_menu.addAction("bulk remove")
+pa_menu_refresh = pa_menu.addAction("bulk refresh")
 pa_menu_add_user = pa_menu.addAction("manually add/edit/remove")
 pa_menu_remove_user = pa_menu.addAction("remove all manually set")
+pa_menu_compact = pa_menu.addAction("compact existing illustrations")
+pa_menu_clean_media = pa_menu.addAction("clean up unused illustration files")
+pa_menu_resume = pa_menu.addAction("resume interrupted bulk add/remove")
+pa_menu_stats = pa_menu.addAction("accent type statistics")
 pa_menu_custom_db_path = pa_menu.addAction("show custom DB path")
+pa_menu_dict_status = pa_menu.addAction("dictionary status")
 pa_menu_about = pa_menu.addAction("about")
 if not (
     pa_menu
     and pa_menu_add
     and pa_menu_remove
+    and pa_menu_refresh
     and pa_menu_add_user
     and pa_menu_remove_user
+    and pa_menu_compact
+    and pa_menu_clean_media
+    and pa_menu_resume
+    and pa_menu_stats
     and pa_menu_custom_db_path
+    and pa_menu_dict_status
     and pa_menu_about
 ):
     # exit if any of the above could not be created
     sys.exit(1)
 
 # add triggers
-pa_menu_add.triggered.connect(add_pitch_dialog)
-pa_menu_remove.triggered.connect(remove_pitch_dialog)
-pa_menu_add_user.triggered.connect(add_user_pitch_dialog)
-pa_menu_remove_user.triggered.connect(remove_user_pitch_dialog)
-pa_menu_custom_db_path.triggered.connect(show_custom_db_path_dialog)
-pa_menu_about.triggered.connect(about_dialog)
+pa_menu_add.triggered.connect(run_dialog("add_pitch_dialog"))
+pa_menu_remove.triggered.connect(run_dialog("remove_pitch_dialog"))
+pa_menu_refresh.triggered.connect(run_dialog("refresh_pitch_dialog"))
+pa_menu_add_user.triggered.connect(run_dialog("add_user_pitch_dialog"))
+pa_menu_remove_user.triggered.connect(run_dialog("remove_user_pitch_dialog"))
+pa_menu_compact.triggered.connect(run_dialog("compact_pitch_dialog"))
+pa_menu_clean_media.triggered.connect(run_dialog("clean_pitch_media_dialog"))
+pa_menu_resume.triggered.connect(run_dialog("resume_dialog"))
+pa_menu_stats.triggered.connect(run_dialog("accent_type_stats_dialog"))
+pa_menu_custom_db_path.triggered.connect(run_dialog("show_custom_db_path_dialog"))
+pa_menu_dict_status.triggered.connect(run_dialog("dict_status_dialog"))
+pa_menu_about.triggered.connect(run_dialog("about_dialog"))
 
 # and add it to the tools menu
 mw.form.menuTools.addMenu(pa_menu)
@@ -394,6 +168,20 @@ mw.form.menuTools.addMenu(pa_menu)
 # add editor button
 gui_hooks.editor_did_init_buttons.append(add_set_pitch_buttons)
 
+# add browser menu
+gui_hooks.browser_menus_did_init.append(add_browser_menu)
+
+# local lookup service (if enabled)
+gui_hooks.profile_did_open.append(start_lookup_service)
+gui_hooks.profile_will_close.append(stop_lookup_service)
+
+# release pitch accent dicts when idle (checked every minute) and on
+# profile close
+dict_idle_timer = QTimer(mw)
+dict_idle_timer.timeout.connect(release_idle_dicts)
+dict_idle_timer.start(60 * 1000)
+gui_hooks.profile_will_close.append(release_dicts)
+
 # # pre-load pitch accent dicts once collection is loaded
 # gui_hooks.collection_did_load.append(pre_load_pitch_data)
 # # commented out for the moment because presumably for most people
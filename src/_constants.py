@@ -19,6 +19,29 @@ re_variation_selectors_patt = re.compile(
 )
 # [1] https://en.wikipedia.org/wiki/Variation_Selectors_Supplement
 re_bracketed_content_patt = re.compile(r"[\[\(\{][^\]\)\}]*[\]\)\}]")
+# furigana or ruby notation (fields without are parsed like before)
+re_furigana_marker_patt = re.compile(r"\[|<rt\b", re.I)
+# tokens of a note field for parsing expression and furigana/ruby reading
+# (see furigana.py)
+re_field_token_patt = re.compile(
+    r"(?P<comment><!--.*?-->)"
+    r"|(?P<skip><(?:style|script)\b.*?</(?:style|script)>)"
+    r"|<(?P<close>/?)(?P<tag>[a-zA-Z]+)[^>]*>"
+    r"|\[(?P<furigana>[^\]]*)\]"
+    r"|(?P<bracketed>[\(\{][^\]\)\}<]*[\]\)\}])"
+    r"|&(?P<entity>#?[a-zA-Z0-9]+);"
+    rf"|(?P<ja>{re_ja_patt.pattern})"
+    r"|(?P<space>\s+)"
+    rf"|(?P<varsel>{re_variation_selectors_patt.pattern})"
+    r"|(?P<other>[a-zA-Z0-9]+|.)",
+    re.S | re.I,
+)
+re_all_kana_patt = re.compile(
+    r"^["
+    r"\u3041-\u3096"  # hiragana
+    r"\u30A0-\u30FF"  # katakana
+    r"]+$"
+)
 re_hira_patt = re.compile(
     r"["
     r"\u3041-\u3096"  # hiragana
@@ -29,3 +52,28 @@ re_all_hira_patt = re.compile(
     r"\u3041-\u3096"  # hiragana
     r"]+$"
 )
+re_pitch_data_patt = re.compile(
+    r'<span class="pitch_data" data-kana="([^"]*)" data-pattern="([^"]*)"></span>'
+)
+re_pitch_media_patt = re.compile(
+    r'<img class="pitch_media" src="([^"]*)"'
+    r' data-kana="([^"]*)" data-pattern="([^"]*)">'
+)
+# file names of illustrations in the collection media folder
+re_pitch_media_fn_patt = re.compile(r"^pitch_[0-9a-f]{16}\.svg$")
+# any reference to such a file (regardless of the markup around it)
+re_pitch_media_ref_patt = re.compile(r"pitch_[0-9a-f]{16}\.svg")
+re_pitch_svg_patt = re.compile(r'<svg class="pitch[ "].*?</svg>', re.S)
+# accent type class of an SVG (e.g. class="pitch odaka")
+re_pitch_svg_type_patt = re.compile(r'<svg class="pitch ([a-z]+)"')
+re_svg_text_patt = re.compile(r"<text[^>]*>([^<]*)</text>")
+# center of outer circles (y position 5 for high, 30 for low)
+re_svg_circle_cy_patt = re.compile(r'<circle r="5" cx="[^"]*" cy="([^"]*)"')
+# auto or user set pitch accent annotation including its markers
+# (groups: "user_" prefix, fingerprint, content between the markers)
+re_accent_block_patt = re.compile(
+    r"<!-- (user_)?accent_start(?: ([0-9a-f]+))? -->"
+    r"(.*?)"
+    r"<!-- (?:user_)?accent_end -->",
+    re.S,
+)
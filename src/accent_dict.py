@@ -0,0 +1,475 @@
+"""Compact in-memory representation of pitch accent dictionaries."""
+
+import ctypes
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from typing import BinaryIO
+from .draw_pitch import accent_types, classify_accent, register_accent_types
+from .types import (
+    AccentDict,
+    ExpressionStr,
+    KanaStr,
+    PitchAccentNotation,
+    PitchAccentNotationPerMora,
+    ReadingWithPitchPattern,
+)
+
+# array type code of 4 byte unsigned integers (used for all indices)
+uint32 = "I" if array("I").itemsize == 4 else "L"
+
+
+class CompactAccentDict(Mapping):
+    """Read-only mapping from expressions to lists of (reading, pattern)
+    tuples, i.e. a drop-in replacement for a plain AccentDict.
+
+    Readings and patterns are stored once each in interned tables. The
+    (reading, pattern) lists of all expressions are stored as pairs of
+    table indices in one flat integer array, and orthographic variants
+    with an identical list share a single copy. Building streams the
+    entries into flat arrays as well, so that no Python objects are
+    created per entry.
+    The lists handed out on lookup are created on demand. The accent
+    type of each pattern is determined once when building and stored
+    alongside the pattern table (see accent_type).
+
+    A secondary index maps readings to the patterns they occur with
+    (see lookup_reading). It consists of the reading table itself, kept
+    sorted by reading_key for binary search, and the pattern indices of
+    each reading in one flat integer array.
+    """
+
+    def __init__(
+        self,
+        readings: list[KanaStr],
+        patts: list[PitchAccentNotation],
+        patt_types: array,
+        data: array,
+        starts: array,
+        index: dict[ExpressionStr, int],
+        reading_patts: array,
+        reading_starts: array,
+    ):
+        # sorted by reading_key
+        self._readings = readings
+        self._patts = patts
+        # index into accent_types of each pattern (invalid_type_code if
+        # invalid)
+        self._patt_types = patt_types
+        # mora level pattern -> pattern index (few distinct patterns)
+        self._mora_patt_ids = {
+            patt.translate(_lower_case_pitch): pid for pid, patt in enumerate(patts)
+        }
+        # reading/pattern index pairs of list k: data[starts[k]:starts[k + 1]]
+        self._data = data
+        self._starts = starts
+        # expression -> list k
+        self._index = index
+        # pattern indices of reading r:
+        # reading_patts[reading_starts[r]:reading_starts[r + 1]]
+        self._reading_patts = reading_patts
+        self._reading_starts = reading_starts
+        register_accent_types(self)
+
+    @classmethod
+    def build(
+        cls, entries: Iterable[tuple[ExpressionStr, KanaStr, PitchAccentNotation]]
+    ) -> "CompactAccentDict":
+        """Build a dictionary from (expression, reading, pattern) entries.
+        Entries repeated for the same expression are only stored once.
+        """
+
+        readings: list[KanaStr] = []
+        reading_ids: dict[KanaStr, int] = {}
+        patts: list[PitchAccentNotation] = []
+        patt_ids: dict[PitchAccentNotation, int] = {}
+        # (reading, pattern) pairs of each expression as linked lists in
+        # flat arrays, expression -> first pair (list k once stored)
+        pair_rids = array(uint32)
+        pair_pids = array(uint32)
+        pair_next = array("i")
+        index: dict[ExpressionStr, int] = {}
+        for orth, reading, patt in entries:
+            rid = reading_ids.get(reading)
+            if rid is None:
+                rid = reading_ids[reading] = len(readings)
+                readings.append(reading)
+            pid = patt_ids.get(patt)
+            if pid is None:
+                pid = patt_ids[patt] = len(patts)
+                patts.append(patt)
+            i = index.get(orth, -1)
+            last = -1
+            while i != -1:
+                if pair_rids[i] == rid and pair_pids[i] == pid:
+                    break
+                last = i
+                i = pair_next[i]
+            else:
+                if last == -1:
+                    index[orth] = len(pair_rids)
+                else:
+                    pair_next[last] = len(pair_rids)
+                pair_rids.append(rid)
+                pair_pids.append(pid)
+                pair_next.append(-1)
+        del patt_ids
+
+        # sort readings for the reading index and renumber them
+        unsorted = readings[:]
+        readings.sort(key=reading_key)
+        for new_rid, reading in enumerate(readings):
+            reading_ids[reading] = new_rid
+        new_rids = array(uint32, (reading_ids[reading] for reading in unsorted))
+        del unsorted, reading_ids
+        for i, rid in enumerate(pair_rids):
+            pair_rids[i] = new_rids[rid]
+        del new_rids
+
+        # pattern indices of each reading (counting sort of the pairs)
+        counts = array(uint32, [0]) * (len(readings) + 1)
+        for rid in pair_rids:
+            counts[rid + 1] += 1
+        for r in range(len(readings)):
+            counts[r + 1] += counts[r]
+        pos = array(uint32, counts)
+        grouped = array(uint32, [0]) * len(pair_rids)
+        for rid, pid in zip(pair_rids, pair_pids):
+            grouped[pos[rid]] = pid
+            pos[rid] += 1
+        del pos
+        reading_patts = array(uint32)
+        reading_starts = array(uint32, [0])
+        for r in range(len(readings)):
+            reading_patts.extend(sorted(set(grouped[counts[r] : counts[r + 1]])))
+            reading_starts.append(len(reading_patts))
+        del counts, grouped
+
+        # store the lists, sharing a copy between consecutive expressions
+        # with identical lists (orthographic variants of one entry)
+        data = array(uint32)
+        starts = array(uint32, [0])
+        prev: list[int] = []
+        for orth, i in index.items():
+            lst = []
+            while i != -1:
+                lst.extend((pair_rids[i], pair_pids[i]))
+                i = pair_next[i]
+            if lst != prev:
+                data.extend(lst)
+                starts.append(len(data))
+                prev = lst
+            index[orth] = len(starts) - 2
+        patt_types = array(
+            "B",
+            (
+                type_code(classify_accent(patt.translate(_lower_case_pitch)))
+                for patt in patts
+            ),
+        )
+        return cls(
+            readings,
+            patts,
+            patt_types,
+            data,
+            starts,
+            index,
+            reading_patts,
+            reading_starts,
+        )
+
+    # file format: magic, format version, source key, then the tables
+    # (strings newline separated, integers little-endian, 4 byte for
+    # indices and 1 byte for type codes)
+    file_magic = b"PITCHDICT"
+    file_version = 4
+
+    def dump(self, f: BinaryIO, source_key: str = "") -> None:
+        """Write the dictionary to a binary file. source_key identifies
+        the data it was built from (see load).
+        """
+
+        index_ids = array(uint32, self._index.values())
+        sections = [
+            source_key.encode("utf8"),
+            "\n".join(self._readings).encode("utf8"),
+            "\n".join(self._patts).encode("utf8"),
+            self._patt_types.tobytes(),
+            array_to_le_bytes(self._data),
+            array_to_le_bytes(self._starts),
+            "\n".join(self._index).encode("utf8"),
+            array_to_le_bytes(index_ids),
+            array_to_le_bytes(self._reading_patts),
+            array_to_le_bytes(self._reading_starts),
+        ]
+        f.write(self.file_magic + struct.pack("<I", self.file_version))
+        for section in sections:
+            f.write(struct.pack("<Q", len(section)))
+            f.write(section)
+
+    @classmethod
+    def load(cls, f: BinaryIO, source_key: str = "") -> "CompactAccentDict | None":
+        """Read a dictionary written by dump. Returns None if the file has
+        a different format version or was built from other data than
+        source_key.
+        """
+
+        header = f.read(len(cls.file_magic) + 4)
+        if header != cls.file_magic + struct.pack("<I", cls.file_version):
+            return None
+
+        def section() -> bytes:
+            (length,) = struct.unpack("<Q", f.read(8))
+            return f.read(length)
+
+        if section().decode("utf8") != source_key:
+            return None
+        readings = section().decode("utf8").split("\n")
+        patts = section().decode("utf8").split("\n")
+        patt_types = array("B", section())
+        data = array_from_le_bytes(section())
+        starts = array_from_le_bytes(section())
+        orths = section().decode("utf8").split("\n")
+        index_ids = array_from_le_bytes(section())
+        reading_patts = array_from_le_bytes(section())
+        reading_starts = array_from_le_bytes(section())
+        # an empty table is written like a table with an empty string
+        if len(reading_starts) == 1:
+            readings = []
+        if not patt_types:
+            patts = []
+        if not index_ids:
+            orths = []
+        return cls(
+            readings,
+            patts,
+            patt_types,
+            data,
+            starts,
+            dict(zip(orths, index_ids)),
+            reading_patts,
+            reading_starts,
+        )
+
+    def _list(self, k: int) -> list[ReadingWithPitchPattern]:
+        data = self._data
+        return [
+            (self._readings[data[i]], self._patts[data[i + 1]])
+            for i in range(self._starts[k], self._starts[k + 1], 2)
+        ]
+
+    def __getitem__(self, orth: ExpressionStr) -> list[ReadingWithPitchPattern]:
+        return self._list(self._index[orth])
+
+    def get(self, orth, default=None):
+        k = self._index.get(orth)
+        if k is None:
+            return default
+        return self._list(k)
+
+    def lookup_reading(self, reading: KanaStr) -> list[ReadingWithPitchPattern]:
+        """All (reading, pattern) combinations of the dictionary for the
+        given reading (hiragana and katakana are not distinguished),
+        regardless of the expression.
+        """
+
+        key = reading_key(reading)
+        readings = self._readings
+        r = bisect_left(readings, key, key=reading_key)
+        results = []
+        while r < len(readings) and reading_key(readings[r]) == key:
+            for i in range(self._reading_starts[r], self._reading_starts[r + 1]):
+                results.append((readings[r], self._patts[self._reading_patts[i]]))
+            r += 1
+        return results
+
+    def accent_type(self, patt: PitchAccentNotationPerMora) -> str | None:
+        """Precomputed accent type of a mora level pattern of the
+        dictionary. Raises KeyError for other patterns.
+        """
+
+        code = self._patt_types[self._mora_patt_ids[patt]]
+        return None if code == invalid_type_code else accent_types[code]
+
+    def __contains__(self, orth: object) -> bool:
+        return orth in self._index
+
+    def __iter__(self) -> Iterator[ExpressionStr]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+def array_to_le_bytes(arr: array) -> bytes:
+    """Bytes of an integer array in little-endian byte order."""
+
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def array_from_le_bytes(data: bytes) -> array:
+    """Array of 4 byte unsigned integers from little-endian bytes."""
+
+    arr = array(uint32)
+    arr.frombytes(data)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+_lower_case_pitch = str.maketrans("", "", "lh")
+
+# type code of patterns without a valid accent type
+invalid_type_code = len(accent_types)
+
+
+def type_code(acc_type: str | None) -> int:
+    """Code of an accent type in the pattern type array."""
+
+    return invalid_type_code if acc_type is None else accent_types.index(acc_type)
+
+
+# katakana -> hiragana
+_kata_to_hira = {code: code - 96 for code in range(ord("ァ"), ord("ヶ") + 1)}
+
+
+def reading_key(reading: str) -> str:
+    """Key of a reading in the reading index (the reading in hiragana)."""
+
+    return reading.translate(_kata_to_hira)
+
+
+class AccentDictHolder:
+    """Keeps a dictionary loaded on demand and releases it again after
+    it has not been used for a while (see release_if_idle), so that it
+    does not occupy memory for the rest of the session.
+    """
+
+    def __init__(self, name: str, load: Callable[[], AccentDict]):
+        self.name = name
+        self._load = load
+        self._dict: AccentDict | None = None
+        self._lock = threading.Lock()
+        self.last_used = 0.0
+        self.num_loads = 0
+        self.num_releases = 0
+        self.load_time = 0.0
+
+    def get(self) -> AccentDict:
+        """Return the dictionary, loading it if it is not resident."""
+
+        with self._lock:
+            if self._dict is None:
+                start = time.perf_counter()
+                self._dict = self._load()
+                self.load_time = time.perf_counter() - start
+                self.num_loads += 1
+            self.last_used = time.monotonic()
+            return self._dict
+
+    @property
+    def resident(self) -> bool:
+        return self._dict is not None
+
+    def release(self) -> bool:
+        """Drop the dictionary (it is loaded again on next use). Returns
+        whether it was resident.
+        """
+
+        with self._lock:
+            return self._release()
+
+    def release_if_idle(self, max_idle: float) -> bool:
+        """Drop the dictionary if it was not used for max_idle seconds."""
+
+        # in use (e.g. being loaded) if locked, don’t wait for it
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if time.monotonic() - self.last_used < max_idle:
+                return False
+            return self._release()
+        finally:
+            self._lock.release()
+
+    def _release(self) -> bool:
+        # to be called with the lock held
+        if self._dict is None:
+            return False
+        self._dict = None
+        self.num_releases += 1
+        return True
+
+    def status(self) -> dict:
+        """Residency and load statistics."""
+
+        return {
+            "name": self.name,
+            "resident": self.resident,
+            "entries": len(self._dict) if self._dict is not None else None,
+            "idle": time.monotonic() - self.last_used if self.num_loads else None,
+            "loads": self.num_loads,
+            "releases": self.num_releases,
+            "load_time": self.load_time,
+        }
+
+
+def process_rss() -> int | None:
+    """Resident memory of the current process in bytes, None if it can
+    not be determined on this platform.
+    """
+
+    try:
+        if sys.platform.startswith("linux"):
+            with open("/proc/self/statm") as f:
+                pages = int(f.read().split()[1])
+            return pages * os.sysconf("SC_PAGE_SIZE")
+        if sys.platform == "darwin":
+            libproc = ctypes.CDLL("/usr/lib/libproc.dylib")
+            # struct proc_taskinfo (PROC_PIDTASKINFO): virtual size,
+            # resident size, ... (96 bytes)
+            buf = ctypes.create_string_buffer(96)
+            if libproc.proc_pidinfo(os.getpid(), 4, ctypes.c_uint64(0), buf, 96) < 16:
+                return None
+            return struct.unpack_from("=QQ", buf.raw)[1]
+        if sys.platform == "win32":
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [
+                    ("cb", ctypes.c_uint32),
+                    ("PageFaultCount", ctypes.c_uint32),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t),
+                ]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            kernel32 = ctypes.windll.kernel32  # type: ignore[attr-defined]
+            kernel32.GetCurrentProcess.restype = ctypes.c_void_p
+            kernel32.K32GetProcessMemoryInfo.argtypes = [
+                ctypes.c_void_p,
+                ctypes.POINTER(ProcessMemoryCounters),
+                ctypes.c_uint32,
+            ]
+            if not kernel32.K32GetProcessMemoryInfo(
+                kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb
+            ):
+                return None
+            return counters.WorkingSetSize
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
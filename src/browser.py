@@ -0,0 +1,183 @@
+"""Pitch accent actions of the card browser, operating on the selected
+notes.
+"""
+
+from collections import ChainMap
+from textwrap import dedent
+from aqt.qt import QMenu
+from aqt.utils import showInfo, tooltip
+from .dialogs import ambiguous_readings_text
+from .util import (
+    add_pitch,
+    remove_pitch,
+    get_accent_dict,
+    get_user_accent_dict,
+    get_annotation_format,
+    prepare_note_type,
+    group_note_ids_by_note_type,
+    load_field_mapping,
+    save_field_mapping,
+    select_note_fields_add,
+    select_note_fields_del,
+)
+
+add_keys = ["expr_idx", "reading_idx", "output_idx"]
+del_keys = ["del_idx"]
+
+
+def selected_note_ids(browser):
+    """IDs of the notes selected in the browser."""
+
+    if hasattr(browser, "selected_notes"):
+        return list(browser.selected_notes())
+    # Anki < 2.1.45
+    return list(browser.selectedNotes())
+
+
+def fields_add(note_type_id):
+    """Saved expression, reading and output field of the note type, asks
+    for (and saves) them if there are none. None if cancelled.
+    """
+
+    mapping = load_field_mapping(note_type_id, add_keys)
+    if mapping is None:
+        indices = select_note_fields_add(note_type_id)
+        if None in indices:
+            return None
+        mapping = dict(zip(add_keys, indices))
+        save_field_mapping(note_type_id, mapping)
+    return mapping
+
+
+def fields_del(note_type_id):
+    """Saved field to remove annotations from for the note type, asks for
+    (and saves) it if there is none. None if cancelled.
+    """
+
+    mapping = load_field_mapping(note_type_id, del_keys)
+    if mapping is None:
+        del_idx = select_note_fields_del(note_type_id)
+        if del_idx is None:
+            return None
+        mapping = {"del_idx": del_idx}
+        save_field_mapping(note_type_id, mapping)
+    return mapping
+
+
+def after_update(browser, changed_ids):
+    """Show the changed notes in the browser."""
+
+    editor = browser.editor
+    if editor.note is not None and editor.note.id in changed_ids:
+        editor.note.load()
+        editor.loadNoteKeepingFocus()
+    if hasattr(browser, "table"):
+        browser.table.redraw_cells()
+    else:
+        # Anki < 2.1.45
+        browser.model.reset()
+
+
+def add_pitch_to_selected(browser):
+    """Add pitch accent illustrations to the selected notes."""
+
+    note_ids = selected_note_ids(browser)
+    if not note_ids:
+        tooltip("No notes selected.", parent=browser)
+        return
+
+    def run():
+        groups = group_note_ids_by_note_type(note_ids)
+        mappings = {}
+        for note_type_id in groups:
+            mapping = fields_add(note_type_id)
+            if mapping is None:
+                return
+            mappings[note_type_id] = mapping
+
+        # load pitch dict and user pitch dict if present (taking precedence)
+        acc_dict = ChainMap(get_user_accent_dict(), get_accent_dict())
+        annotation_format = get_annotation_format()
+        n_nf = n_updt = n_adone = 0
+        amb_lst = []
+        changed_ids = set()
+        for note_type_id, group_ids in groups.items():
+            mapping = mappings[note_type_id]
+            prepare_note_type(note_type_id, annotation_format)
+            nf_lst, updt, adone, _, amb, change_set = add_pitch(
+                acc_dict,
+                group_ids,
+                mapping["expr_idx"],
+                mapping["reading_idx"],
+                mapping["output_idx"],
+                annotation_format,
+            )
+            n_nf += len(nf_lst)
+            n_updt += updt
+            n_adone += adone
+            amb_lst.extend(amb)
+            changed_ids.update(change_set.changed)
+        after_update(browser, changed_ids)
+        report_text = f"""\
+            done :)
+            skipped {n_adone} already annotated notes
+            updated {n_updt} notes
+            could not find {n_nf} expressions
+            skipped {len(amb_lst)} notes with ambiguous readings"""
+        report_text = dedent(report_text) + ambiguous_readings_text(amb_lst)
+        showInfo(report_text, parent=browser, title="Add pitch results")
+
+    # make sure pending edits in the browser’s editor are saved first
+    browser.editor.call_after_note_saved(run)
+
+
+def remove_pitch_from_selected(browser, user_set=False):
+    """Remove pitch accent illustrations from the selected notes."""
+
+    note_ids = selected_note_ids(browser)
+    if not note_ids:
+        tooltip("No notes selected.", parent=browser)
+        return
+
+    def run():
+        groups = group_note_ids_by_note_type(note_ids)
+        mappings = {}
+        for note_type_id in groups:
+            mapping = fields_del(note_type_id)
+            if mapping is None:
+                return
+            mappings[note_type_id] = mapping
+
+        n_adone = n_updt = 0
+        changed_ids = set()
+        for note_type_id, group_ids in groups.items():
+            adone, updt, change_set = remove_pitch(
+                group_ids, mappings[note_type_id]["del_idx"], user_set
+            )
+            n_adone += adone
+            n_updt += updt
+            changed_ids.update(change_set.changed)
+        after_update(browser, changed_ids)
+        report_text = f"""\
+            done :)
+            skipped {n_adone} notes w/o accent annotation
+            updated {n_updt} notes"""
+        showInfo(dedent(report_text), parent=browser, title="Remove pitch results")
+
+    browser.editor.call_after_note_saved(run)
+
+
+def add_browser_menu(browser):
+    """Add the pitch accent menu to the browser’s Notes menu."""
+
+    menu = QMenu("Pitch Accent", browser)
+    action_add = menu.addAction("add pitch to selected notes")
+    action_add.triggered.connect(lambda: add_pitch_to_selected(browser))
+    action_remove = menu.addAction("remove pitch from selected notes")
+    action_remove.triggered.connect(lambda: remove_pitch_from_selected(browser))
+    action_remove_user = menu.addAction("remove manually set pitch from selected notes")
+    action_remove_user.triggered.connect(
+        lambda: remove_pitch_from_selected(browser, user_set=True)
+    )
+    browser.form.menu_Notes.addSeparator()
+    browser.form.menu_Notes.addMenu(menu)
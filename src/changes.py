@@ -0,0 +1,90 @@
+"""Change sets of the bulk operations (add_pitch, remove_pitch,
+refresh_pitch, migrate_pitch) and the hook announcing them, so that other
+add-ons can act on just the notes touched instead of rescanning the
+collection.
+
+Other add-ons register with the hook through the add-on’s package. It is
+named after the folder the add-on is installed in, which differs between
+installations (within the add-on it is __name__.split(".")[0], as given
+by mw.addonManager.addonFromModule(__name__)), so look it up instead of
+hardcoding it:
+
+    for folder in mw.addonManager.allAddons():
+        if mw.addonManager.addonName(folder) == "Japanese Pitch Accent":
+            changes = importlib.import_module(f"{folder}.changes")
+            changes.notes_did_change.append(on_pitch_change)
+"""
+
+from collections.abc import Callable
+from anki.notes import NoteId
+
+
+class ChangeSet:
+    """Notes changed by a bulk operation, with the size change of each
+    changed field, and the notes processed but left unchanged.
+    """
+
+    def __init__(self, operation: str):
+        # "add", "remove", "refresh" or "migrate"
+        self.operation = operation
+        # note ID -> field index -> size change in bytes (UTF-8)
+        self.changed: dict[NoteId, dict[int, int]] = {}
+        self.skipped: list[NoteId] = []
+
+    def record(self, nid: NoteId, field_idx: int, old: str, new: str) -> None:
+        """Record a change of the note’s field from old to new."""
+
+        deltas = self.changed.setdefault(nid, {})
+        deltas[field_idx] = (
+            deltas.get(field_idx, 0) + len(new.encode("utf8")) - len(old.encode("utf8"))
+        )
+
+    def skip(self, nid: NoteId) -> None:
+        """Record a note as processed but unchanged."""
+
+        self.skipped.append(nid)
+
+    @property
+    def note_ids(self) -> list[NoteId]:
+        """IDs of the changed notes."""
+
+        return list(self.changed)
+
+    def field_bytes_delta(self) -> dict[int, int]:
+        """Total size change in bytes per field index."""
+
+        totals: dict[int, int] = {}
+        for deltas in self.changed.values():
+            for field_idx, delta in deltas.items():
+                totals[field_idx] = totals.get(field_idx, 0) + delta
+        return totals
+
+    def to_dict(self) -> dict:
+        """JSON serializable representation (e.g. for sync tooling)."""
+
+        return {
+            "operation": self.operation,
+            "changed": {
+                str(nid): {str(idx): delta for idx, delta in deltas.items()}
+                for nid, deltas in self.changed.items()
+            },
+            "skipped": self.skipped,
+        }
+
+
+# called with the change set after every bulk operation
+notes_did_change: list[Callable[[ChangeSet], None]] = []
+
+
+def run_notes_did_change(change_set: ChangeSet) -> None:
+    """Pass a change set to all registered hook functions."""
+
+    for func in list(notes_did_change):
+        try:
+            func(change_set)
+        except Exception as e:
+            # don’t let another add-on’s error abort the operation’s report
+            from aqt.utils import showWarning
+
+            name = getattr(func, "__qualname__", repr(func))
+            showWarning(f"Error in pitch accent change hook function {name}: {e}")
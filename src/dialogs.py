@@ -0,0 +1,423 @@
+"""Dialogs of the Tools → Pitch Accent menu."""
+
+import os
+from collections import ChainMap
+from aqt.utils import showInfo, showText, askUser
+from textwrap import dedent
+from . import __author__, __credits__, __license__
+from ._version import __version__
+from .util import (
+    add_pitch,
+    remove_pitch,
+    refresh_pitch,
+    get_accent_dict,
+    get_note_type_ids,
+    get_note_ids,
+    get_note_ids_after,
+    get_user_accent_dict,
+    select_deck_id,
+    select_note_type_id,
+    select_note_fields_add,
+    select_note_fields_del,
+    get_plugin_dir_path,
+    get_annotation_format,
+    prepare_note_type,
+    migrate_pitch,
+    load_checkpoint,
+    clear_checkpoint,
+    count_accent_types,
+    accent_dict_holder,
+    process_rss,
+    user_accent_dict_holder,
+    clean_pitch_media,
+    pitch_storage_size,
+    save_field_mapping,
+)
+
+
+def about_dialog() -> None:
+    """Popup displaying information about the add-on."""
+
+    contrib: str = "<br>".join(__credits__)
+    gh_link: str = "https://github.com/IllDepence/anki_add_pitch_plugin"
+    aw_link: str = "https://ankiweb.net/shared/info/148002038"
+    license_link: str = gh_link + "/blob/master/LICENSE"
+
+    info_text: str = f"""\
+        <center>
+        <h3>Japanese Pitch Accent</h3>
+        <p><b>Version</b><br>{__version__}</p>
+        <p>
+            <b>License</b><br>
+            <a href="{license_link}">{__license__}</a>
+        </p>
+        <p><b>Maintainer</b><br>{__author__}</p>
+        <p><b>Contributors</b><br>{contrib}</p>
+        <p>
+            <a href="{gh_link}">GitHub</a>
+            &nbsp;<b>&middot;</b>&nbsp;
+            <a href="{aw_link}">AnkiWeb</a>
+        </p>
+        </center>"""
+
+    showText(
+        dedent(info_text),
+        title="About",
+        type="html",
+        minWidth=200,
+        minHeight=340,
+    )
+
+
+def select_deck_notes(msg):
+    """Let the user choose a deck (prompting with msg) and, if the deck
+    contains several, a note type. Returns the deck ID, note type ID and
+    the IDs of the matching notes, or None if cancelled or nothing was
+    found.
+    """
+
+    deck_id = select_deck_id(msg)
+    if deck_id is None:
+        return None
+    note_type_ids = get_note_type_ids(deck_id)
+    if len(note_type_ids) > 1:
+        note_type_id = select_note_type_id(note_type_ids)
+    elif len(note_type_ids) < 1:
+        showInfo("No cards found in deck.")
+        return None
+    else:
+        note_type_id = note_type_ids[0]
+    if note_type_id is None:
+        return None
+    note_ids = get_note_ids(deck_id, note_type_id)
+    if len(note_ids) == 0:
+        showInfo("No cards found for selected note type.")
+        return None
+    return deck_id, note_type_id, note_ids
+
+
+def add_pitch_dialog() -> None:
+    """Dialog for bulk adding pitch accent illustrations to notes."""
+
+    # figure out collection structure
+    selection = select_deck_notes("Which deck would you like to extend?")
+    if selection is None:
+        return
+    deck_id, note_type_id, note_ids = selection
+    expr_idx, rdng_idx, out_idx = select_note_fields_add(note_type_id)
+    if expr_idx is None or rdng_idx is None or out_idx is None:
+        return
+    # remember for the browser actions
+    save_field_mapping(
+        note_type_id,
+        {"expr_idx": expr_idx, "reading_idx": rdng_idx, "output_idx": out_idx},
+    )
+
+    params = {
+        "op": "add",
+        "deck_id": deck_id,
+        "note_type_id": note_type_id,
+        "expr_idx": expr_idx,
+        "reading_idx": rdng_idx,
+        "output_idx": out_idx,
+        "annotation_format": get_annotation_format(),
+    }
+    run_add_pitch(params, note_ids)
+
+
+def run_add_pitch(params, note_ids, resumed=False):
+    """Bulk add pitch accent illustrations as described by the
+    (checkpoint) parameters and report the results.
+    """
+
+    # load pitch dict and user pitch dict if present (taking precedence)
+    acc_dict = ChainMap(get_user_accent_dict(), get_accent_dict())
+
+    # data only/compact annotations need the renderer/CSS in the note type
+    annotation_format = params["annotation_format"]
+    prepare_note_type(params["note_type_id"], annotation_format)
+
+    # extend notes
+    nf_lst, n_updt, n_adone, n_sfail, amb_lst, _ = add_pitch(
+        acc_dict,
+        note_ids,
+        params["expr_idx"],
+        params["reading_idx"],
+        params["output_idx"],
+        annotation_format,
+        checkpoint=params,
+    )
+    resumed_txt = " (resumed run)" if resumed else ""
+    report_text = f"""\
+        done :){resumed_txt}
+        skipped {n_adone} already annotated notes
+        updated {n_updt} notes
+        failed to generate {n_sfail} annotations
+        could not find {len(nf_lst)} expressions
+        skipped {len(amb_lst)} notes with ambiguous readings"""
+    report_text = dedent(report_text) + ambiguous_readings_text(amb_lst)
+    showInfo(report_text, title="Bulk add results")
+
+
+def ambiguous_readings_text(amb_lst, max_listed=10) -> str:
+    """List notes skipped because their reading matches several pitch
+    accent patterns (for the add pitch reports).
+    """
+
+    if not amb_lst:
+        return ""
+    lines = [
+        f"{expr} ({n_cands} patterns for its reading)"
+        for _, expr, n_cands in amb_lst[:max_listed]
+    ]
+    if len(amb_lst) > max_listed:
+        lines.append(f"… and {len(amb_lst) - max_listed} more")
+    return "\n\nambiguous readings:\n" + "\n".join(lines)
+
+
+def refresh_pitch_dialog() -> None:
+    """Dialog for re-generating outdated pitch accent illustrations."""
+
+    # load pitch dict and user pitch dict if present (taking precedence)
+    acc_dict = ChainMap(get_user_accent_dict(), get_accent_dict())
+
+    # figure out collection structure
+    selection = select_deck_notes("Which deck would you like to refresh?")
+    if selection is None:
+        return
+    deck_id, note_type_id, note_ids = selection
+    expr_idx, rdng_idx, out_idx = select_note_fields_add(note_type_id)
+    if expr_idx is None or rdng_idx is None or out_idx is None:
+        return
+
+    annotation_format = get_annotation_format()
+    prepare_note_type(note_type_id, annotation_format)
+
+    # refresh notes
+    n_unann, n_uptd, n_updt, n_nf, _ = refresh_pitch(
+        acc_dict, note_ids, expr_idx, rdng_idx, out_idx, annotation_format
+    )
+    report_text = f"""\
+        done :)
+        skipped {n_unann} notes w/o automatically added annotation
+        skipped {n_uptd} up to date notes
+        updated {n_updt} notes
+        could not find {n_nf} expressions (left as is)"""
+    showInfo(dedent(report_text), title="Refresh results")
+
+
+def add_user_pitch_dialog():
+    """Popup explaining how to manually set pitch accent illustrations."""
+
+    icon_img = (
+        "data:image/svg+xml;base64,PHN2ZwogICB2aWV3Qm94PSIwIDAgMjIuNSAyMi41Igo"
+        "gICBoZWlnaHQ9IjIyLjUiCiAgIHdpZHRoPSIyMi41IgogICBjbGFzcz0icGl0Y2giPgog"
+        "IDxwYXRoCiAgICAgaWQ9InBhdGg4NTIiCiAgICAgc3R5bGU9ImZpbGw6bm9uZTtzdHJva"
+        "2U6IzAwMDAwMDtzdHJva2Utd2lkdGg6MS41IgogICAgIGQ9Ik0gMi41LDE3LjUgMjAsNS"
+        "IgLz4KICA8Y2lyY2xlCiAgICAgaWQ9ImNpcmNsZTg1NCIKICAgICBzdHlsZT0ib3BhY2l"
+        "0eToxO2ZpbGw6IzAwMDAwMDtzdHJva2Utd2lkdGg6MSIKICAgICBjeT0iMTcuNSIKICAg"
+        "ICBjeD0iMi41IgogICAgIHI9IjIuNSIgLz4KICA8Y2lyY2xlCiAgICAgaWQ9ImNpcmNsZ"
+        "Tg1NiIKICAgICBzdHlsZT0ib3BhY2l0eToxO2ZpbGw6IzAwMDAwMDtzdHJva2Utd2lkdG"
+        "g6MSIKICAgICBjeT0iNSIKICAgICBjeD0iMjAiCiAgICAgcj0iMi41IiAvPgogIDxjaXJ"
+        "jbGUKICAgICBpZD0iY2lyY2xlODU4IgogICAgIHN0eWxlPSJvcGFjaXR5OjE7ZmlsbDoj"
+        "ZmZmZmZmO3N0cm9rZS13aWR0aDoxIgogICAgIGN5PSI1IgogICAgIGN4PSIyMCIKICAgI"
+        "CByPSIxLjYyNSIgLz4KPC9zdmc+Cg=="
+    )
+
+    info_text = f"""\
+        <p>
+            When adding or editing cards, click the pitch accent icon located
+            on the right hand side of the text formatting buttons to manually
+            insert, overwrite, or remove the pitch accent.<br>
+        </p>
+        <table>
+            <tr>
+            <td align="left" valign="middle">
+                <img src="{icon_img}">
+            </td>
+            <td valign="middle" align="center">
+                &nbsp;&larr; icon to look for
+            </td>
+            </tr>
+        </table>"""
+
+    showInfo(dedent(info_text), title="Manually add/edit/remove", textFormat="rich")
+
+
+def show_custom_db_path_dialog():
+    """Popup explaining the user custom dictionary."""
+
+    user_pitch_csv_path = os.path.join(get_plugin_dir_path(), "user_pitchdb.csv")
+
+    custom_db_text = f"""\
+        <p>You can extend and overwrite pitch accent patterns using the
+        file <code>{user_pitch_csv_path}</code>. The file has to be three
+        columns (expression, reading, pitch accent pattern) separated by
+        <kbd>TAB</kbd> characters.</p>"""
+    showInfo(dedent(custom_db_text), title="Custom DB path", textFormat="rich")
+
+
+def remove_user_pitch_dialog():
+    """Dialog for bulk removing user added custom pitch accent
+    illustrations from nodes.
+    """
+
+    return remove_pitch_dialog(user_set=True)
+
+
+def remove_pitch_dialog(user_set=False):
+    """Dialog for bulk removing pitch accent illustrations from nodes."""
+
+    # figure out collection structure
+    selection = select_deck_notes("From which deck would you like to remove?")
+    if selection is None:
+        return
+    deck_id, note_type_id, note_ids = selection
+    del_idx = select_note_fields_del(note_type_id)
+    if del_idx is None:
+        return
+    save_field_mapping(note_type_id, {"del_idx": del_idx})
+
+    params = {
+        "op": "remove",
+        "deck_id": deck_id,
+        "note_type_id": note_type_id,
+        "del_idx": del_idx,
+        "user_set": user_set,
+    }
+    run_remove_pitch(params, note_ids)
+
+
+def run_remove_pitch(params, note_ids, resumed=False):
+    """Bulk remove pitch accent illustrations as described by the
+    (checkpoint) parameters and report the results.
+    """
+
+    # remove from notes
+    n_adone, n_updt, _ = remove_pitch(
+        note_ids, params["del_idx"], params["user_set"], checkpoint=params
+    )
+    resumed_txt = " (resumed run)" if resumed else ""
+    report_text = f"""\
+        done :){resumed_txt}
+        skipped {n_adone} notes w/o accent annotation
+        updated {n_updt} notes"""
+    showInfo(dedent(report_text), title="Bulk remove results")
+
+
+def resume_dialog():
+    """Dialog for resuming an interrupted bulk add or remove."""
+
+    checkpoint = load_checkpoint()
+    if checkpoint is None:
+        showInfo("There is no interrupted bulk add or remove to resume.")
+        return
+    params = checkpoint["params"]
+    last_nid = checkpoint["last_nid"]
+    op_name = {"add": "bulk add", "remove": "bulk remove"}[params["op"]]
+    if not askUser(f"Resume the interrupted {op_name}? (Choosing “No” discards it.)"):
+        clear_checkpoint()
+        return
+
+    # only notes after the last committed one
+    note_ids = get_note_ids_after(params["deck_id"], params["note_type_id"], last_nid)
+    if params["op"] == "add":
+        run_add_pitch(params, note_ids, resumed=True)
+    else:
+        run_remove_pitch(params, note_ids, resumed=True)
+
+
+def compact_pitch_dialog():
+    """Dialog for re-rendering all existing pitch accent illustrations
+    as compact SVGs.
+    """
+
+    if not askUser(
+        "Re-render all existing pitch accent illustrations in the "
+        "collection as compact SVGs? Their styling will be added to "
+        "the CSS of the affected note types."
+    ):
+        return
+
+    n_chkd, n_updt, n_saved, _ = migrate_pitch("svg_compact")
+    report_text = f"""\
+        done :)
+        checked {n_chkd} annotated notes
+        updated {n_updt} notes
+        saved {n_saved / 1024:.1f} KiB"""
+    if get_annotation_format() != "svg_compact":
+        report_text += """
+        (set annotation_format to "svg_compact" in the add-on
+        config to also create new illustrations in compact form)"""
+    showInfo(dedent(report_text), title="Compact illustrations results")
+
+
+def accent_type_stats_dialog():
+    """Popup showing the number of pitch accent annotations in a deck
+    per accent type.
+    """
+
+    deck_id = select_deck_id("Which deck would you like statistics for?")
+    if deck_id is None:
+        return
+
+    counts = count_accent_types(deck_id)
+    total = sum(counts.values())
+    if total == 0:
+        showInfo("No pitch accent annotations found in deck.")
+        return
+    report_text = "\n".join(
+        f"{acc_type}: {num} ({100 * num / total:.1f}%)"
+        for acc_type, num in counts.items()
+        if num or acc_type != "other"
+    )
+    showInfo(f"{report_text}\n\n{total} annotations", title="Accent types")
+
+
+def dict_status_dialog():
+    """Popup showing whether the pitch accent dictionaries are loaded
+    and how often they were (re)loaded.
+    """
+
+    lines = []
+    for holder in (accent_dict_holder, user_accent_dict_holder):
+        status = holder.status()
+        if status["resident"]:
+            state = f"loaded ({status['entries']} entries)"
+        else:
+            state = "not loaded"
+        lines.append(f"{status['name']} dictionary: {state}")
+        lines.append(
+            f"    loaded {status['loads']} times"
+            f" (last load took {status['load_time']:.2f}s),"
+            f" released {status['releases']} times"
+        )
+        if status["idle"] is not None:
+            lines.append(f"    last used {status['idle'] / 60:.0f} minutes ago")
+    rss = process_rss()
+    if rss is not None:
+        lines.append(f"Anki memory use: {rss / 2**20:.0f} MiB")
+    showInfo("\n".join(lines), title="Dictionary status")
+
+
+def clean_pitch_media_dialog():
+    """Dialog for removing illustration files (of the "media" annotation
+    format) no longer used by any note, reporting the space used by
+    pitch accent annotations.
+    """
+
+    if not askUser(
+        "Move pitch accent illustration files that are no longer used by "
+        "any note to the media trash?"
+    ):
+        return
+
+    n_files, n_bytes = clean_pitch_media()
+    n_fld_bytes, n_media_files, n_media_bytes = pitch_storage_size()
+    report_text = f"""\
+        done :)
+        removed {n_files} unused files ({n_bytes / 1024:.1f} KiB)
+
+        annotations in note fields: {n_fld_bytes / 1024:.1f} KiB
+        illustration files: {n_media_files} ({n_media_bytes / 1024:.1f} KiB)"""
+    showInfo(dedent(report_text), title="Clean up illustration files results")
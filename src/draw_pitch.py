@@ -1,4 +1,15 @@
+import hashlib
 import sys
+import weakref
+from functools import lru_cache
+from html import escape, unescape
+from ._constants import (
+    re_pitch_data_patt,
+    re_pitch_media_patt,
+    re_pitch_svg_patt,
+    re_svg_text_patt,
+    re_svg_circle_cy_patt,
+)
 from .types import (
     KanaStr,
     MoraList,
@@ -37,15 +48,96 @@ def hira_to_mora(hira: KanaStr) -> MoraList:
     return mora_arr
 
 
-def circle(x: int, y: int, o: bool = False) -> SvgStr:
+# increase when the output of pitch_markup changes, so that existing
+# annotations are considered stale by their fingerprint
+renderer_version = 2
+
+# accent types, added as second class of the SVG (e.g. class="pitch odaka")
+accent_types = ("heiban", "atamadaka", "nakadaka", "odaka")
+
+# weak references to the loaded dictionaries with precomputed accent
+# types of their patterns (see register_accent_types), removed once a
+# dictionary is released
+accent_type_sources: list[weakref.ref] = []
+
+# note type CSS for compact SVGs (pitch_svg(..., compact=True)), which
+# use short class names instead of inline styles on every element
+compact_css = """\
+svg.pitch text { font-size: 20px; font-family: sans-serif; fill: #000; }
+svg.pitch text.s { font-size: 14px; }
+svg.pitch path { fill: none; stroke: #000; stroke-width: 1.5; }
+svg.pitch circle { fill: #000; }
+svg.pitch circle.o { fill: #fff; }
+"""
+
+
+def classify_accent(patt: PitchAccentNotationPerMora) -> str | None:
+    """Accent type of a mora level pattern including the pitch of the
+    following particle, determined by the position of the downstep.
+    Returns None for invalid patterns.
+
+    Examples:
+        LHH heiban, HLL atamadaka, LHLL nakadaka, LHL odaka
+    """
+
+    if len(patt) < 2 or any(ch not in "HL012" for ch in patt):
+        return None
+    for i in range(len(patt) - 1):
+        if patt[i] in "H12" and patt[i + 1] not in "H12":
+            if i == 0:
+                return "atamadaka"
+            if i == len(patt) - 2:
+                return "odaka"
+            return "nakadaka"
+    return "heiban"
+
+
+def register_accent_types(source) -> None:
+    """Use the precomputed accent types of a dictionary (an object with
+    an accent_type method raising KeyError for unknown patterns) while
+    it is loaded.
+    """
+
+    accent_type_sources.append(weakref.ref(source, accent_type_sources.remove))
+
+
+def accent_type(patt: PitchAccentNotationPerMora) -> str | None:
+    """Accent type of a mora level pattern (precomputed by a loaded
+    dictionary, or else classified on the fly).
+    """
+
+    for ref in accent_type_sources:
+        source = ref()
+        if source is None:
+            continue
+        try:
+            return source.accent_type(patt)
+        except KeyError:
+            pass
+    return classify_accent(patt)
+
+
+def circle(x: int, y: int, o: bool = False, compact: bool = False) -> SvgStr:
+    if compact:
+        r = f'<circle r="5" cx="{x}" cy="{y}"/>'
+        if o:
+            r += f'<circle class="o" r="3.25" cx="{x}" cy="{y}"/>'
+        return SvgStr(r)
     r = f'<circle r="5" cx="{x}" cy="{y}" style="opacity:1;fill:#000;" />'
     if o:
         r += f'<circle r="3.25" cx="{x}" cy="{y}" style="opacity:1;fill:#fff;" />'
     return SvgStr(r)
 
 
-def text(x: int, mora: KanaStr) -> SvgStr:
+def text(x: int, mora: KanaStr, compact: bool = False) -> SvgStr:
     # letter positioning tested with Noto Sans CJK JP
+    if compact:
+        if len(mora) == 1:
+            return SvgStr(f'<text x="{x}" y="67.5">{mora}</text>')
+        return SvgStr(
+            f'<text x="{x - 5}" y="67.5">{mora[0]}</text>'
+            f'<text class="s" x="{x + 12}" y="67.5">{mora[1]}</text>'
+        )
     if len(mora) == 1:
         return SvgStr(
             (
@@ -64,13 +156,17 @@ def text(x: int, mora: KanaStr) -> SvgStr:
         )
 
 
-def path(x: int, y: int, typ: PitchChangeDirection, step_width: int) -> SvgStr:
+def path(
+    x: int, y: int, typ: PitchChangeDirection, step_width: int, compact: bool = False
+) -> SvgStr:
     if typ == "s":  # straight
         delta = f"{step_width},0"
     elif typ == "u":  # up
         delta = f"{step_width},-25"
     elif typ == "d":  # down
         delta = f"{step_width},25"
+    if compact:
+        return SvgStr(f'<path d="m{x},{y} {delta}"/>')
     return SvgStr(
         (
             f'<path d="m {x},{y} {delta}" style="fill:none;stroke:#000;stroke-width:1.5;" />'
@@ -79,10 +175,17 @@ def path(x: int, y: int, typ: PitchChangeDirection, step_width: int) -> SvgStr:
 
 
 def pitch_svg(
-    word: KanaStr, patt: PitchAccentNotationPerMora, silent: bool = False
+    word: KanaStr,
+    patt: PitchAccentNotationPerMora,
+    silent: bool = False,
+    compact: bool = False,
 ) -> SvgStr:
     """Draw pitch accent patterns in SVG
 
+    If compact is True, elements are styled through the classes in
+    compact_css instead of inline styles. The accent type (see
+    accent_types) is added as second class of the SVG.
+
     Examples:
         はし HLL (箸)
         はし LHL (橋)
@@ -98,14 +201,25 @@ def pitch_svg(
     margin_lr: int = 16
     svg_width: int = max(0, ((positions - 1) * step_width) + (margin_lr * 2))
 
-    svg: str = (
-        f'<svg class="pitch" width="{svg_width}px" height="75px" viewBox="0 0 {svg_width} 75">'
-    )
+    acc_type = accent_type(patt)
+    svg_cls: str = f"pitch {acc_type}" if acc_type else "pitch"
+
+    svg: str
+    if compact:
+        svg = (
+            f'<svg class="{svg_cls}" width="{svg_width}" height="75"'
+            f' viewBox="0 0 {svg_width} 75">'
+        )
+    else:
+        svg = (
+            f'<svg class="{svg_cls}" width="{svg_width}px" height="75px"'
+            f' viewBox="0 0 {svg_width} 75">'
+        )
 
     chars: str = ""
     for pos, mor in enumerate(mora):
         x_center = margin_lr + (pos * step_width)
-        chars += text(x_center - 11, mor)
+        chars += text(x_center - 11, mor, compact)
 
     circles: str = ""
     paths: str = ""
@@ -120,7 +234,7 @@ def pitch_svg(
         else:
             # in case of an invalid accent mark, annotate in the center
             y_center = 17
-        circles += circle(x_center, y_center, pos >= len(mora))
+        circles += circle(x_center, y_center, pos >= len(mora), compact)
         if pos > 0:
             if prev_center[1] == y_center:
                 path_typ = "s"
@@ -128,7 +242,7 @@ def pitch_svg(
                 path_typ = "d"
             elif prev_center[1] > y_center:
                 path_typ = "u"
-            paths += path(prev_center[0], prev_center[1], path_typ, step_width)
+            paths += path(prev_center[0], prev_center[1], path_typ, step_width, compact)
         prev_center = (x_center, y_center)
 
     svg += chars
@@ -139,6 +253,107 @@ def pitch_svg(
     return SvgStr(svg)
 
 
+def pitch_data(word: KanaStr, patt: PitchAccentNotationPerMora) -> str:
+    """Compact data only pitch accent annotation, drawn client side by
+    pitch_render.js (using the same geometry as pitch_svg).
+    """
+
+    return (
+        f'<span class="pitch_data" data-kana="{escape(word)}"'
+        f' data-pattern="{escape(patt)}"></span>'
+    )
+
+
+def pitch_svg_file(
+    word: KanaStr, patt: PitchAccentNotationPerMora
+) -> tuple[str, bytes]:
+    """File name and content of an illustration as standalone SVG file.
+    The file name is derived from the content, so identical illustrations
+    share one file.
+    """
+
+    svg = pitch_svg(word, patt, silent=True)
+    data = svg.replace("<svg ", '<svg xmlns="http://www.w3.org/2000/svg" ', 1)
+    data_bytes = data.encode("utf8")
+    return f"pitch_{hashlib.sha1(data_bytes).hexdigest()[:16]}.svg", data_bytes
+
+
+@lru_cache(maxsize=4096)
+def pitch_media(word: KanaStr, patt: PitchAccentNotationPerMora) -> str:
+    """Pitch accent annotation referencing the illustration as file in
+    the collection media folder (see pitch_svg_file, writing the file
+    is up to the caller).
+    """
+
+    file_name, _ = pitch_svg_file(word, patt)
+    return (
+        f'<img class="pitch_media" src="{file_name}"'
+        f' data-kana="{escape(word)}" data-pattern="{escape(patt)}">'
+    )
+
+
+def pitch_markup(
+    word: KanaStr,
+    patt: PitchAccentNotationPerMora,
+    annotation_format: str = "svg",
+    silent: bool = False,
+) -> str:
+    """Pitch accent annotation in the given format ("svg", "svg_compact",
+    "data" or "media"). If silent is True, invalid patterns are not
+    reported (see pitch_svg).
+    """
+
+    if annotation_format == "data":
+        return pitch_data(word, patt)
+    if annotation_format == "media":
+        return pitch_media(word, patt)
+    return pitch_svg(
+        word, patt, silent=silent, compact=annotation_format == "svg_compact"
+    )
+
+
+def pitch_fingerprint(
+    word: KanaStr, patt: PitchAccentNotationPerMora, annotation_format: str = "svg"
+) -> str:
+    """Short fingerprint of everything determining an annotation (kana,
+    pattern, renderer version and annotation format).
+    """
+
+    key = f"{word}\x1f{patt}\x1f{renderer_version}\x1f{annotation_format}"
+    return hashlib.sha1(key.encode("utf8")).hexdigest()[:8]
+
+
+def parse_pitch_markup(
+    markup: str,
+) -> tuple[KanaStr, PitchAccentNotationPerMora] | None:
+    """Recover kana and pattern from a pitch accent annotation in any
+    of the formats produced by pitch_markup. Returns None if markup
+    contains no annotation.
+    """
+
+    data_match = re_pitch_data_patt.search(markup)
+    if data_match:
+        return (
+            KanaStr(unescape(data_match.group(1))),
+            PitchAccentNotationPerMora(unescape(data_match.group(2))),
+        )
+    media_match = re_pitch_media_patt.search(markup)
+    if media_match:
+        return (
+            KanaStr(unescape(media_match.group(2))),
+            PitchAccentNotationPerMora(unescape(media_match.group(3))),
+        )
+    svg_match = re_pitch_svg_patt.search(markup)
+    if not svg_match:
+        return None
+    svg = svg_match.group(0)
+    kana = "".join(re_svg_text_patt.findall(svg))
+    patt = "".join(
+        {"5": "H", "30": "L"}.get(cy, "X") for cy in re_svg_circle_cy_patt.findall(svg)
+    )
+    return KanaStr(kana), PitchAccentNotationPerMora(patt)
+
+
 if __name__ == "__main__":
     if len(sys.argv) != 3:
         print("usage: python3 draw_pitch.py <word> <patt>")
@@ -0,0 +1,393 @@
+"""Pitch accent buttons of the note editor."""
+
+import json
+import os
+import re
+from collections import ChainMap
+from functools import lru_cache
+from aqt import mw, gui_hooks
+from aqt.qt import (
+    QDialog,
+    QDialogButtonBox,
+    QLabel,
+    QLineEdit,
+    QTimer,
+    QVBoxLayout,
+)
+from aqt.utils import showInfo, tooltip
+from aqt.webview import AnkiWebView
+from ._constants import re_all_hira_patt
+from .types import HiraganaStr
+
+
+@lru_cache(maxsize=256)
+def preview_svg(hira, LH_patt):
+    """Pitch accent illustration for the manual dialog’s preview."""
+
+    from .draw_pitch import pitch_svg
+
+    return pitch_svg(hira, LH_patt, silent=True)
+
+
+class ManualPitchDialog(QDialog):
+    """Dialog for entering reading and pitch accent pattern with a live
+    preview of the resulting illustration.
+    """
+
+    # delay after the last key press before the preview is updated (ms)
+    preview_delay = 150
+
+    def __init__(self, parent):
+        from .util import get_qt_version
+
+        super().__init__(parent)
+        self.setWindowTitle("Set pitch accent")
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+        layout.addWidget(QLabel("Reading (example: はな)"))
+        self.hira_edit = QLineEdit()
+        layout.addWidget(self.hira_edit)
+        layout.addWidget(
+            QLabel("Pitch accent pattern as a sequence of 'H's and 'L's (example: LHL)")
+        )
+        self.patt_edit = QLineEdit()
+        layout.addWidget(self.patt_edit)
+        layout.addWidget(QLabel("Leave both empty to remove the illustration."))
+        self.preview = AnkiWebView(parent=self, title="pitch accent preview")
+        self.preview.setMinimumHeight(110)
+        self.preview.stdHtml(
+            '<div id="pitch"></div>',
+            head="<style>.nightMode svg.pitch { filter: invert(1); }</style>",
+        )
+        layout.addWidget(self.preview)
+        if get_qt_version() == 6:
+            buts = (
+                QDialogButtonBox.StandardButton.Ok
+                | QDialogButtonBox.StandardButton.Cancel
+            )
+        else:
+            buts = QDialogButtonBox.Ok | QDialogButtonBox.Cancel
+        bb = QDialogButtonBox(buts)
+        bb.accepted.connect(self.accept)
+        bb.rejected.connect(self.reject)
+        layout.addWidget(bb)
+
+        # debounce preview updates while typing
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(self.preview_delay)
+        self.preview_timer.timeout.connect(self.update_preview)
+        self.hira_edit.textChanged.connect(lambda _: self.preview_timer.start())
+        self.patt_edit.textChanged.connect(lambda _: self.preview_timer.start())
+        self.shown = ("", "")
+
+    def values(self):
+        return self.hira_edit.text().strip(), self.patt_edit.text().strip()
+
+    def prefill(self, hira, LH_patt):
+        """Fill in a suggestion, unless the user already started typing."""
+
+        if self.values() == ("", ""):
+            self.hira_edit.setText(hira)
+            self.patt_edit.setText(LH_patt)
+
+    def update_preview(self):
+        values = self.values()
+        if values == self.shown:
+            return
+        self.shown = values
+        svg = preview_svg(*values) if all(values) else ""
+        self.preview.eval(
+            f"document.getElementById('pitch').innerHTML = {json.dumps(svg)};"
+        )
+
+
+def set_pitch_manually_dialog(editor):
+    """Dialog for manually setting the pitch accent illustration
+    in the currently selected editor field.
+
+    The dialog is pre-filled with the automatically looked up pitch
+    accent, if found (looked up in the background).
+    """
+
+    field_idx = editor.web.editor.currentField
+    if field_idx is None:
+        showInfo("A field needs to be selected")
+        return
+
+    from .util import get_qt_version
+
+    dialog = ManualPitchDialog(editor.widget)
+
+    guess = guess_expr_reading(editor)
+    if guess is not None:
+
+        def on_done(future):
+            try:
+                patt = future.result()
+            except Exception:
+                # e.g. dictionary failed to load, leave the dialog empty
+                return
+            if patt:
+                hira, LlHh_patt = patt
+                dialog.prefill(hira, re.sub(r"[lh]", "", LlHh_patt))
+
+        mw.taskman.run_in_background(lambda: lookup_acc_patt(*guess), on_done)
+
+    if get_qt_version() == 6:
+        ret = dialog.exec()
+    else:
+        ret = dialog.exec_()
+    if ret == 0:
+        return
+
+    hira, LH_patt = dialog.values()
+    set_pitch(editor, hira, LH_patt, field_idx)
+
+
+# JS setting the content of a single editor field (args: index, HTML,
+# JS to run afterwards) through the API Anki’s editor provides for
+# add-ons, evaluates to false if the editor does not support this
+set_field_js = """(function (idx, html) {
+    try {
+        const fld = require("anki/NoteEditor").instances[0].fields[idx];
+        fld.editingArea.content.set(html);
+    } catch (e) {
+        return false;
+    }
+    %s
+    return true;
+})(%s, %s);"""
+
+# latest auto pitch request (editor, note, field index, expression field,
+# reading)
+# while a lookup is running, None otherwise
+_auto_pitch_request = None
+
+
+def set_pitch_automatically(editor):
+    """Automatically set the pitch accent illustration
+    in the currently selected editor field.
+
+    Dictionary loading and lookup run in the background. Clicks
+    while a lookup is running are coalesced, only the latest one
+    is applied (to the field that was selected when clicking).
+    """
+
+    global _auto_pitch_request
+
+    field_idx = editor.web.editor.currentField
+    if field_idx is None:
+        showInfo("A field needs to be selected")
+        return
+
+    guess = guess_expr_reading(editor)
+    if guess is None:
+        showInfo("Could not identify expression", title="Card parsing failure")
+        return
+    expr_field, reading_guess = guess
+
+    lookup_running = _auto_pitch_request is not None
+    _auto_pitch_request = (editor, editor.note, field_idx, expr_field, reading_guess)
+    if lookup_running:
+        # picked up once the running lookup is done
+        return
+    tooltip("looking up pitch accent…", parent=editor.widget)
+    run_auto_pitch_lookup()
+
+
+def guess_expr_reading(editor):
+    """Guess the expression field and reading of the note in the editor.
+    The expression field is returned as is, so lookups can fall back to
+    its first word (see get_acc_patt). Returns None if no expression
+    could be identified.
+    """
+
+    from .furigana import parse_expression_field
+
+    # try to determine note fields
+    expr_field = None
+    reading_guess = None
+    for fld, val_unesc in editor.note.items():
+        val = editor.mw.col.media.escapeImages(val_unesc)
+        parsed = parse_expression_field(val)
+        if parsed is None:
+            # no Japanese, next
+            continue
+        ja_expr, furigana_reading = parsed
+        if expr_field is None:
+            # assume expression field comes before others,
+            # so only set once (and don’t overwrite later
+            # with content that might be in subsequent fields)
+            expr_field = val
+        elif furigana_reading and reading_guess is None:
+            # field in furigana/ruby notation, use its reading (that of
+            # the expression field is used when looking it up)
+            reading_guess = HiraganaStr(furigana_reading)
+        all_hira_match = re_all_hira_patt.search(ja_expr)
+        if all_hira_match and reading_guess is None:
+            # if first continuous block is all hiragana, treat as reading
+            # and don’t override afterwards
+            reading_guess = HiraganaStr(all_hira_match.group(0))
+        if expr_field is not None and reading_guess is not None:
+            # found all that we needed
+            break
+    if expr_field is None:
+        return None
+    if reading_guess is None:
+        # could imagine user that just does expr to meaning (with no
+        # field for reading) and then wants to add pitch accent illustrations
+        reading_guess = HiraganaStr("")
+
+    return expr_field, reading_guess
+
+
+def lookup_acc_patt(expr, reading):
+    """Look up the accent pattern of an expression (loads the pitch
+    accent dictionaries if necessary, so may take a while).
+    """
+
+    from .util import get_acc_patt
+
+    return get_acc_patt(expr, reading, accent_dicts())
+
+
+def accent_dicts():
+    from .util import get_accent_dict, get_user_accent_dict
+
+    # load pitch dict and user pitch dict if present (taking precedence)
+    return [ChainMap(get_user_accent_dict(), get_accent_dict())]
+
+
+def run_auto_pitch_lookup():
+    """Look up the pitch accent for the latest auto pitch request off
+    the GUI thread and apply the result once done.
+    """
+
+    request = _auto_pitch_request
+    _, _, _, expr_field, reading_guess = request
+
+    def on_done(future):
+        global _auto_pitch_request
+
+        if _auto_pitch_request is not request:
+            # clicked again in the meantime, look up latest request instead
+            run_auto_pitch_lookup()
+            return
+        _auto_pitch_request = None
+        editor, note, field_idx, _, _ = request
+        try:
+            patt = future.result()
+        except Exception as e:
+            tooltip(f"Pitch accent lookup failed: {e}", parent=editor.widget)
+            return
+        if editor.note is not note:
+            # editor switched to a different note while looking up
+            return
+        if not patt:
+            from .furigana import parse_expression_field
+            from .util import count_reading_candidates
+
+            num_candidates = count_reading_candidates(
+                expr_field, reading_guess, accent_dicts()
+            )
+            expr_guess = parse_expression_field(expr_field)[0]
+            if num_candidates > 1:
+                msg = (
+                    f"Could not find pitch for expression “{expr_guess}”, "
+                    f"its reading has {num_candidates} different patterns"
+                )
+            else:
+                msg = f"Could not find pitch for expression “{expr_guess}”"
+            showInfo(msg, title="Card parsing failure")
+            return
+        hira, LlHh_patt = patt
+        LH_patt = re.sub(r"[lh]", "", LlHh_patt)
+
+        set_pitch(editor, hira, LH_patt, field_idx)
+
+    mw.taskman.run_in_background(
+        lambda: lookup_acc_patt(expr_field, reading_guess), on_done
+    )
+
+
+def set_pitch(editor, hira, LH_patt, field_idx=None):
+    """Set the pitch accent illustration in the editor’s current
+    selected field (or the field at field_idx, if given) according
+    to the hiragana and low-high pattern given.
+    """
+
+    if field_idx is None:
+        field_idx = editor.web.editor.currentField
+
+    # remove existing patt
+    acc_patt = re.compile(
+        r"<!-- (user_)?accent_start[^>]*-->.+<!-- (user_)?accent_end -->", re.S
+    )
+    old_field_val = editor.note.fields[field_idx]
+    old_field_val_clean = re.sub(acc_patt, "", old_field_val)
+
+    if hira == "" and LH_patt == "":
+        # only remove
+        new_field_val = old_field_val_clean
+    else:
+        # generate annotation
+        from .util import (
+            add_pitch_to_field_content,
+            get_annotation_format,
+            pitch_annotation,
+            prepare_note_type,
+        )
+
+        annotation_format = get_annotation_format()
+        prepare_note_type(editor.note.note_type()["id"], annotation_format)
+        markup, fingerprint = pitch_annotation(hira, LH_patt, annotation_format)
+        # add pitch to field
+        new_field_val = add_pitch_to_field_content(
+            old_field_val_clean, markup, True, fingerprint
+        )
+
+    if new_field_val == old_field_val:
+        return
+    new_field_html = editor.mw.col.media.escapeImages(new_field_val)
+    # update and save the note the way the editor does for typing in
+    # the field (incl. undo entry and editor hooks)
+    editor.onBridgeCmd(f"key:{field_idx}:{editor.note.id}:{new_field_html}")
+    # only patch the changed field in the webview, code of other add-ons
+    # for a (re)loaded note is run after it
+    js = set_field_js % (
+        gui_hooks.editor_will_load_note("", editor.note, editor),
+        json.dumps(field_idx),
+        json.dumps(new_field_html),
+    )
+    editor.web.evalWithCallback(
+        js,
+        # editor without the API needed for patching, reload whole note
+        lambda patched: patched or editor.loadNoteKeepingFocus(),
+    )
+
+
+def add_set_pitch_buttons(buttons, editor):
+    """Add pitch buttons to editor menu."""
+
+    # runs for every editor (adding, browsing, ...), the rest of the
+    # add-on is only imported once a button is used
+    addon_dir = os.path.dirname(__file__)
+    # manual mode
+    icon_path_m = os.path.join(addon_dir, "icon_manual.png")
+    m_btn = editor.addButton(
+        icon_path_m,
+        "manualpitch",
+        set_pitch_manually_dialog,
+        tip="set pitch accent manually",
+    )
+    buttons.append(m_btn)
+    # auto mode
+    icon_path_a = os.path.join(addon_dir, "icon_auto.png")
+    a_btn = editor.addButton(
+        icon_path_a,
+        "autopitch",
+        set_pitch_automatically,
+        tip="set pitch accent automatically",
+    )
+    buttons.append(a_btn)
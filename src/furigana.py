@@ -0,0 +1,187 @@
+"""Parsing of expression and reading from note fields, including fields
+in Anki furigana notation (漢字[かんじ]) or HTML ruby notation
+(<ruby>漢字<rt>かんじ</rt></ruby>).
+"""
+
+import html
+from anki.utils import strip_html
+from ._constants import (
+    re_ja_patt,
+    re_variation_selectors_patt,
+    re_bracketed_content_patt,
+    re_furigana_marker_patt,
+    re_field_token_patt,
+    re_all_kana_patt,
+)
+from .types import ExpressionStr, KanaStr
+
+no_reading = KanaStr("")
+
+
+def parse_expression_field(field: str) -> tuple[ExpressionStr, KanaStr] | None:
+    """Extract the first expression (consecutive Japanese text) of a note
+    field together with its reading.
+
+    HTML tags, comments, variation selectors and bracketed content are
+    skipped, HTML entities are decoded. Furigana/ruby readings are used for the text they annotate,
+    other (kana) text is its own reading. The reading is empty if the
+    field has no furigana/ruby. Returns None if there is no Japanese text.
+
+    Text without furigana/ruby that is not kana has no known reading, so
+    the reading is left empty as well in that case (e.g. 食[た]べ物).
+
+    Space separated furigana segments are joined, up to the first
+    segment without furigana (e.g. a particle or plain text). The first
+    segment on its own is a fallback for lookups (see
+    parse_expression_candidates).
+
+    Examples:
+        <b>日本語</b> (Japanese) -> 日本語, ""
+        食[た]べ 物[もの] -> 食べ物, たべもの
+        行[い]く 人[ひと] です -> 行く人, いくひと
+        <ruby>橋<rt>はし</rt></ruby>を -> 橋を, はしを
+    """
+
+    candidates = parse_expression_candidates(field)
+    if not candidates:
+        return None
+    return candidates[0]
+
+
+def parse_expression_candidates(field: str) -> list[tuple[ExpressionStr, KanaStr]]:
+    """Expressions to look up for a note field, best guess first (see
+    parse_expression_field), followed by the first space separated
+    segment if it has furigana itself (e.g. 行[い]く 人[ひと] -> 行く人,
+    行く). Whether space separated furigana segments are one word or
+    several can’t be told from the field alone. Empty if there is no
+    Japanese text.
+    """
+
+    if not re_furigana_marker_patt.search(field):
+        # nothing to annotate the expression with
+        expr = first_japanese(field)
+        if expr is None:
+            return []
+        return [(expr, no_reading)]
+
+    expr = ""
+    reading = ""
+    # base text since the last annotated segment
+    seg = ""
+    has_furigana = False
+    # whether all text without furigana/ruby is kana
+    reading_known = True
+    in_rt = False
+    in_rp = False
+    rt = ""
+    # whether the current space separated segment has furigana/ruby
+    seg_annotated = False
+    # state at the last space (expression, reading, reading known, has
+    # furigana) and after the first segment, if annotated
+    at_space = None
+    first = None
+    for match in re_field_token_patt.finditer(field):
+        kind = match.lastgroup
+        if kind == "tag":
+            tag = match.group("tag").lower()
+            closing = match.group("close") == "/"
+            if tag == "rt":
+                in_rt = not closing
+                if in_rt:
+                    rt = ""
+                elif rt and seg:
+                    expr += seg
+                    reading += rt
+                    seg = ""
+                    has_furigana = seg_annotated = True
+            elif tag == "rp":
+                in_rp = not closing
+            elif tag == "ruby":
+                # ruby base starts (or ends) here
+                expr, reading, reading_known = flush(expr, reading, seg, reading_known)
+                seg = ""
+            continue
+        text = match.group(0)
+        if kind == "entity":
+            # decode like strip_html does (e.g. &#26085; -> 日)
+            text = html.unescape(text)
+            if text.isspace():
+                kind = "space"
+            elif re_ja_patt.fullmatch(text):
+                kind = "ja"
+            else:
+                kind = "other"
+        if in_rp:
+            continue
+        if in_rt:
+            if kind == "ja":
+                rt += text
+            continue
+        if kind == "ja":
+            seg += text
+        elif kind == "furigana":
+            # readings may be followed by further annotations (e.g. pitch)
+            content = match.group("furigana").split(";")[0].split(",")[0].strip()
+            if seg and re_all_kana_patt.match(content):
+                expr += seg
+                reading += content
+                seg = ""
+                has_furigana = seg_annotated = True
+        elif kind == "space":
+            if not (expr or seg) or (at_space and expr + seg == at_space[0]):
+                # nothing since the last space
+                continue
+            expr, reading, reading_known = flush(expr, reading, seg, reading_known)
+            seg = ""
+            if at_space is not None and not seg_annotated:
+                # segment without furigana ends the expression
+                break
+            # separates furigana segments (e.g. 食[た]べ 物[もの]) or,
+            # if furigana follows, words (e.g. お 母[かあ]さん)
+            at_space = (expr, reading, reading_known, has_furigana)
+            if first is None and seg_annotated:
+                first = at_space
+            seg_annotated = False
+        elif kind == "other" and (expr or seg):
+            # end of expression
+            break
+        # everything else (comments, bracketed content, ...) is skipped
+    expr, reading, reading_known = flush(expr, reading, seg, reading_known)
+    if at_space is not None and not seg_annotated:
+        # last segment has no furigana, it isn’t part of the expression
+        expr, reading, reading_known, has_furigana = at_space
+    states = [(expr, reading, reading_known, has_furigana)]
+    if first is not None and first[0] != expr:
+        states.append(first)
+    candidates = []
+    for expr, reading, reading_known, has_furigana in states:
+        if not expr:
+            continue
+        if not (has_furigana and reading_known):
+            reading = ""
+        candidates.append((ExpressionStr(expr), KanaStr(reading)))
+    return candidates
+
+
+def first_japanese(field: str) -> ExpressionStr | None:
+    """First consecutive Japanese text of a field without furigana/ruby,
+    after removing HTML, bracketed content and variation selectors.
+    """
+
+    text = strip_html(field)
+    text = re_bracketed_content_patt.sub("", text)
+    text = re_variation_selectors_patt.sub("", text)
+    ja_match = re_ja_patt.search(text)
+    if ja_match:
+        return ExpressionStr(ja_match.group(0))
+    return None
+
+
+def flush(
+    expr: str, reading: str, seg: str, reading_known: bool
+) -> tuple[str, str, bool]:
+    """Append text without furigana/ruby to expression and reading."""
+
+    if seg and not re_all_kana_patt.match(seg):
+        reading_known = False
+    return expr + seg, reading + seg, reading_known
@@ -0,0 +1,127 @@
+/* Japanese Pitch Accent add-on: client side renderer for data only
+ * pitch accent annotations (<span class="pitch_data" ...>). Draws the
+ * same SVG as draw_pitch.py. Included in card templates as
+ * <script src="_pitch_render.js"></script>
+ */
+(function () {
+    "use strict";
+
+    var combiners = "ゃゅょぁぃぅぇぉャュョァィゥェォ";
+
+    function hiraToMora(hira) {
+        var mora = [];
+        var i = 0;
+        while (i < hira.length) {
+            if (i + 1 < hira.length && combiners.indexOf(hira[i + 1]) >= 0) {
+                mora.push(hira[i] + hira[i + 1]);
+                i += 2;
+            } else {
+                mora.push(hira[i]);
+                i += 1;
+            }
+        }
+        return mora;
+    }
+
+    function esc(s) {
+        return s.replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;");
+    }
+
+    function circle(x, y, o) {
+        var r = '<circle r="5" cx="' + x + '" cy="' + y +
+            '" style="opacity:1;fill:#000;" />';
+        if (o) {
+            r += '<circle r="3.25" cx="' + x + '" cy="' + y +
+                '" style="opacity:1;fill:#fff;" />';
+        }
+        return r;
+    }
+
+    function text(x, mora) {
+        // letter positioning tested with Noto Sans CJK JP
+        if (mora.length === 1) {
+            return '<text x="' + x + '" y="67.5" style="font-size:20px;' +
+                'font-family:sans-serif;fill:#000;">' + esc(mora) + "</text>";
+        }
+        return '<text x="' + (x - 5) + '" y="67.5" style="font-size:20px;' +
+            'font-family:sans-serif;fill:#000;">' + esc(mora[0]) + "</text>" +
+            '<text x="' + (x + 12) + '" y="67.5" style="font-size:14px;' +
+            'font-family:sans-serif;fill:#000;">' + esc(mora[1]) + "</text>";
+    }
+
+    function path(x, y, typ, stepWidth) {
+        var delta = { s: "0", u: "-25", d: "25" }[typ];
+        return '<path d="m ' + x + "," + y + " " + stepWidth + "," + delta +
+            '" style="fill:none;stroke:#000;stroke-width:1.5;" />';
+    }
+
+    // same as draw_pitch.classify_accent
+    function accentType(patt) {
+        if (patt.length < 2 || /[^HL012]/.test(patt)) {
+            return null;
+        }
+        for (var i = 0; i < patt.length - 1; i++) {
+            if ("H12".indexOf(patt[i]) >= 0 && "H12".indexOf(patt[i + 1]) < 0) {
+                if (i === 0) {
+                    return "atamadaka";
+                }
+                return i === patt.length - 2 ? "odaka" : "nakadaka";
+            }
+        }
+        return "heiban";
+    }
+
+    function pitchSvg(word, patt) {
+        var mora = hiraToMora(word);
+        var positions = Math.max(mora.length, patt.length);
+        var stepWidth = 35;
+        var marginLr = 16;
+        var svgWidth = Math.max(0, (positions - 1) * stepWidth + marginLr * 2);
+
+        var chars = "";
+        for (var i = 0; i < mora.length; i++) {
+            chars += text(marginLr + i * stepWidth - 11, mora[i]);
+        }
+
+        var circles = "";
+        var paths = "";
+        var prev = null;
+        for (var pos = 0; pos < patt.length; pos++) {
+            var xCenter = marginLr + pos * stepWidth;
+            var yCenter = 17;  // invalid accent mark, annotate in the center
+            if ("Hh12".indexOf(patt[pos]) >= 0) {
+                yCenter = 5;
+            } else if ("Ll0".indexOf(patt[pos]) >= 0) {
+                yCenter = 30;
+            }
+            circles += circle(xCenter, yCenter, pos >= mora.length);
+            if (prev !== null) {
+                var typ = "s";
+                if (prev[1] < yCenter) {
+                    typ = "d";
+                } else if (prev[1] > yCenter) {
+                    typ = "u";
+                }
+                paths += path(prev[0], prev[1], typ, stepWidth);
+            }
+            prev = [xCenter, yCenter];
+        }
+
+        var accType = accentType(patt);
+        var svgCls = accType ? "pitch " + accType : "pitch";
+        return '<svg class="' + svgCls + '" width="' + svgWidth +
+            'px" height="75px" ' +
+            'viewBox="0 0 ' + svgWidth + ' 75">' + chars + paths + circles +
+            "</svg>";
+    }
+
+    var nodes = document.querySelectorAll("span.pitch_data:not([data-rendered])");
+    for (var n = 0; n < nodes.length; n++) {
+        var node = nodes[n];
+        node.innerHTML = pitchSvg(
+            node.getAttribute("data-kana") || "",
+            node.getAttribute("data-pattern") || ""
+        );
+        node.setAttribute("data-rendered", "");
+    }
+})();
@@ -0,0 +1,214 @@
+"""Local JSON-RPC lookup service.
+
+Lets other tools and add-ons use the pitch accent dictionaries already
+loaded by the add-on. Listens on localhost only and speaks JSON-RPC 2.0
+over HTTP POST (keep-alive, batch requests supported).
+
+Methods
+    lookup(expression, reading="")
+        -> {"kana": ..., "pattern": ...} or null
+    lookup_batch(pairs, render=false, format="svg")
+        pairs: [[expression, reading], ...]
+        -> [{"kana": ..., "pattern": ..., ("markup": ...)} or null, ...]
+    render(kana, pattern, format="svg")
+        -> markup
+    render_batch(items, format="svg")
+        items: [[kana, pattern], ...]
+        -> [markup, ...]
+
+    format is one of "svg", "svg_compact" or "data". ("media" isn’t
+    offered, as it refers to files in the collection’s media folder.)
+
+Example
+    curl -d '{"jsonrpc": "2.0", "id": 1, "method": "lookup",
+              "params": {"expression": "橋", "reading": "はし"}}'
+         http://127.0.0.1:8767
+"""
+
+import json
+import threading
+from urllib.parse import urlsplit
+from collections import ChainMap
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .draw_pitch import pitch_markup
+from .util import (
+    get_accent_dict,
+    get_user_accent_dict,
+    get_acc_patt,
+    get_pitch_batch,
+    char_lvl_patt_to_mora_lvl_patt,
+)
+
+_server: ThreadingHTTPServer | None = None
+
+render_formats = ("svg", "svg_compact", "data")
+allowed_hosts = ("127.0.0.1", "localhost")
+
+
+class RPCError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def accent_dicts():
+    # user pitch dict (if present) takes precedence
+    return [ChainMap(get_user_accent_dict(), get_accent_dict())]
+
+
+def lookup(expression, reading=""):
+    patt = get_acc_patt(expression, reading, accent_dicts())
+    if not patt:
+        return None
+    return {"kana": patt[0], "pattern": char_lvl_patt_to_mora_lvl_patt(patt[1])}
+
+
+def check_format(format) -> None:
+    if format not in render_formats:
+        raise RPCError(
+            -32602, f"Invalid params: format must be one of {', '.join(render_formats)}"
+        )
+
+
+def lookup_batch(pairs, render=False, format="svg"):
+    if render:
+        check_format(format)
+    results = []
+    for result in get_pitch_batch(
+        pairs, accent_dicts(), annotation_format=format if render else None
+    ):
+        if result is None:
+            results.append(None)
+            continue
+        kana, patt, markup = result
+        res = {"kana": kana, "pattern": patt}
+        if render:
+            res["markup"] = markup
+        results.append(res)
+    return results
+
+
+def render(kana, pattern, format="svg"):
+    check_format(format)
+    return pitch_markup(kana, pattern, format)
+
+
+def render_batch(items, format="svg"):
+    check_format(format)
+    return [pitch_markup(kana, pattern, format) for kana, pattern in items]
+
+
+methods = {
+    "lookup": lookup,
+    "lookup_batch": lookup_batch,
+    "render": render,
+    "render_batch": render_batch,
+}
+
+
+def handle_call(call) -> dict | None:
+    """Process a single JSON-RPC call. Returns the response, or None for
+    notifications (calls without ID).
+    """
+
+    call_id = call.get("id") if isinstance(call, dict) else None
+    try:
+        if not isinstance(call, dict) or call.get("jsonrpc") != "2.0":
+            raise RPCError(-32600, "Invalid Request")
+        method = methods.get(call.get("method"))
+        if method is None:
+            raise RPCError(-32601, "Method not found")
+        params = call.get("params", {})
+        try:
+            if isinstance(params, list):
+                result = method(*params)
+            else:
+                result = method(**params)
+        except TypeError as e:
+            raise RPCError(-32602, f"Invalid params: {e}")
+        response = {"jsonrpc": "2.0", "id": call_id, "result": result}
+    except RPCError as e:
+        response = {
+            "jsonrpc": "2.0",
+            "id": call_id,
+            "error": {"code": e.code, "message": e.message},
+        }
+    except Exception as e:
+        response = {
+            "jsonrpc": "2.0",
+            "id": call_id,
+            "error": {"code": -32603, "message": f"Internal error: {e}"},
+        }
+    if isinstance(call, dict) and "id" not in call:
+        return None
+    return response
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    # keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if self.headers.get("Origin") is not None or not self.host_allowed():
+            # refuse requests from web pages, also through DNS rebinding
+            self.send_json(403, None)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length))
+        except ValueError:
+            error = {"code": -32700, "message": "Parse error"}
+            self.send_json(200, {"jsonrpc": "2.0", "id": None, "error": error})
+            return
+        if isinstance(request, list):
+            responses = [handle_call(call) for call in request]
+            response = [r for r in responses if r is not None] or None
+        else:
+            response = handle_call(request)
+        self.send_json(200, response)
+
+    def host_allowed(self) -> bool:
+        host = self.headers.get("Host")
+        if host is None:
+            return False
+        try:
+            return urlsplit(f"//{host}").hostname in allowed_hosts
+        except ValueError:
+            return False
+
+    def send_json(self, status, data):
+        body = b"" if data is None else json.dumps(data).encode("utf8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # don’t write every request to stderr
+        pass
+
+
+def start_service(port: int) -> None:
+    """Start the service on localhost in a background thread."""
+
+    global _server
+
+    if _server is not None:
+        return
+    _server = ThreadingHTTPServer(("127.0.0.1", port), RequestHandler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+
+
+def stop_service() -> None:
+    """Stop the service, if running."""
+
+    global _server
+
+    if _server is None:
+        return
+    _server.shutdown()
+    _server.server_close()
+    _server = None
@@ -1,3 +1,4 @@
+from collections.abc import Mapping
 from typing import NewType, Literal
 
 # A string containing only hiragana
@@ -31,7 +32,7 @@ ReadingWithPitchPattern = (
     ReadingWithPitchPatternPerCharacter | ReadingWithPitchPatternPerMora
 )
 # A dictionary of expressions and their pitch accents
-AccentDict = dict[
+AccentDict = Mapping[
     ExpressionStr,
     list[ReadingWithPitchPatternPerCharacter | ReadingWithPitchPatternPerMora],
 ]
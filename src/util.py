@@ -1,16 +1,32 @@
 """Utility functions."""
 
+import json
 import os
 import re
+import struct
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
 from aqt import mw
 from aqt.utils import Qt, QDialog, QVBoxLayout, QLabel, QListWidget, QDialogButtonBox
-from anki.utils import strip_html
+from anki.utils import ids2str
 from anki.decks import DeckId
 from anki.cards import CardId
 from anki.notes import Note, NoteId
 from anki.models import NotetypeId, NotetypeDict
-from functools import lru_cache
-from .draw_pitch import pitch_svg
+from ._version import __version__
+from .accent_dict import AccentDictHolder, CompactAccentDict, process_rss
+from .changes import ChangeSet, run_notes_did_change
+from .furigana import parse_expression_field, parse_expression_candidates
+from .draw_pitch import (
+    pitch_svg,
+    pitch_markup,
+    pitch_fingerprint,
+    parse_pitch_markup,
+    compact_css,
+    accent_type,
+    accent_types,
+    pitch_svg_file,
+)
 from .types import (
     KanaStr,
     HiraganaStr,
@@ -24,12 +40,33 @@ from .types import (
     SvgStr,
 )
 from ._constants import (
-    re_ja_patt,
     re_hira_patt,
-    re_variation_selectors_patt,
-    re_bracketed_content_patt,
+    re_all_kana_patt,
+    re_accent_block_patt,
+    re_pitch_svg_type_patt,
+    re_pitch_data_patt,
+    re_pitch_media_patt,
+    re_pitch_media_fn_patt,
+    re_pitch_media_ref_patt,
+    re_pitch_svg_patt,
 )
 
+# file name of the client side renderer in the collection media folder
+# (leading underscore so it is kept by Anki’s “Check Media”)
+pitch_renderer_fn = "_pitch_render.js"
+# bulk operation checkpoint in the add-on’s user_files directory
+checkpoint_fn = "bulk_checkpoint.json"
+# fields chosen per note type, by name (in user_files)
+field_mappings_fn = "field_mappings.json"
+# precompiled pitch accent dict shipped with the add-on instead of the
+# CSV (built by tools/compile_dict.py, see Makefile)
+dict_artifact_fn = "wadoku_pitchdb.pitchdict"
+# binary cache of the parsed pitch accent dict (in user_files)
+dict_cache_fn = "wadoku_pitchdb.cache"
+# markers around the compact SVG styling in note type CSS
+compact_css_start = "/* pitch accent start */"
+compact_css_end = "/* pitch accent end */"
+
 
 def get_qt_version() -> int:
     """Return the version of Qt used by Anki."""
@@ -66,6 +103,150 @@ def get_plugin_dir_path() -> str:
     return plugin_dir_path
 
 
+def get_user_files_path(file_name: str) -> str:
+    """Return the path of a file in the add-on’s user_files directory
+    (which is kept when the add-on is updated).
+    """
+
+    user_files_path = os.path.join(get_plugin_dir_path(), "user_files")
+    os.makedirs(user_files_path, exist_ok=True)
+    return os.path.join(user_files_path, file_name)
+
+
+def save_checkpoint(params: dict, last_nid: NoteId | None) -> None:
+    """Save the parameters of a running bulk operation together with
+    the ID of the last note that has been committed.
+    """
+
+    checkpoint = {"params": params, "last_nid": last_nid}
+    path = get_user_files_path(checkpoint_fn)
+    # write to temporary file first so a crash can’t leave a broken checkpoint
+    with open(f"{path}.tmp", "w", encoding="utf8") as f:
+        json.dump(checkpoint, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_checkpoint() -> dict | None:
+    """Return the checkpoint of an interrupted bulk operation, if any."""
+
+    path = get_user_files_path(checkpoint_fn)
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf8") as f:
+        return json.load(f)
+
+
+def clear_checkpoint() -> None:
+    """Remove the checkpoint of a bulk operation (once it is finished)."""
+
+    path = get_user_files_path(checkpoint_fn)
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+def commit_chunk(notes: list[Note], checkpoint: dict | None, last_nid: NoteId) -> None:
+    """Save a chunk of changed notes and, if the bulk operation is
+    checkpointed, record last_nid as the last processed note ID.
+    """
+
+    if notes:
+        mw.col.update_notes(notes)
+    if checkpoint is not None:
+        save_checkpoint(checkpoint, last_nid)
+
+
+def get_config() -> dict:
+    """Return the add-on configuration."""
+
+    config = mw.addonManager.getConfig(__name__)
+    return config if config else {}
+
+
+def get_annotation_format() -> str:
+    """Return the configured annotation format ("svg", "svg_compact"
+    or "data").
+    """
+
+    return get_config().get("annotation_format", "svg")
+
+
+def install_pitch_renderer(note_type_id: NotetypeId) -> bool:
+    """Make sure the client side renderer for data only annotations
+    is in the collection media folder and included in all card
+    templates of the given note type.
+
+    Returns True if the note type had to be changed.
+    """
+
+    if not mw.col:
+        return False
+
+    # (re)write media file, so the renderer stays up to date with the add-on
+    with open(os.path.join(get_plugin_dir_path(), "pitch_render.js"), "rb") as f:
+        renderer = f.read()
+    media_path = os.path.join(mw.col.media.dir(), pitch_renderer_fn)
+    current = None
+    if os.path.isfile(media_path):
+        with open(media_path, "rb") as f:
+            current = f.read()
+    if current != renderer:
+        with open(media_path, "wb") as f:
+            f.write(renderer)
+
+    note_type: NotetypeDict | None = mw.col.models.get(note_type_id)
+    if not note_type:
+        return False
+    script_tag = f'<script src="{pitch_renderer_fn}"></script>'
+    changed = False
+    for tmpl in note_type["tmpls"]:
+        for side in ["qfmt", "afmt"]:
+            if script_tag not in tmpl[side]:
+                tmpl[side] += f"\n{script_tag}"
+                changed = True
+    if changed:
+        mw.col.models.update_dict(note_type)
+    return changed
+
+
+def install_compact_css(note_type_id: NotetypeId) -> bool:
+    """Make sure the styling for compact SVG annotations is part of the
+    CSS of the given note type.
+
+    Returns True if the note type had to be changed.
+    """
+
+    if not mw.col:
+        return False
+
+    note_type: NotetypeDict | None = mw.col.models.get(note_type_id)
+    if not note_type:
+        return False
+    css_block = f"{compact_css_start}\n{compact_css}{compact_css_end}"
+    if css_block in note_type["css"]:
+        return False
+    # replace an outdated version, if present
+    css = re.sub(
+        rf"\n*{re.escape(compact_css_start)}.*{re.escape(compact_css_end)}",
+        "",
+        note_type["css"],
+        flags=re.S,
+    )
+    note_type["css"] = f"{css}\n\n{css_block}"
+    mw.col.models.update_dict(note_type)
+    return True
+
+
+def prepare_note_type(note_type_id: NotetypeId, annotation_format: str) -> None:
+    """Add what the annotation format needs to be displayed (renderer
+    script or CSS) to the given note type.
+    """
+
+    if annotation_format == "data":
+        install_pitch_renderer(note_type_id)
+    elif annotation_format == "svg_compact":
+        install_compact_css(note_type_id)
+
+
 def customChooseList(msg: str, choices: list[str], startrow: int = 0) -> int | None:
     """Copy of https://github.com/ankitects/anki/blob/main/
     qt/aqt/utils.py but with a cancel button and title
@@ -148,67 +329,170 @@ def select_note_type_id(note_type_ids) -> NotetypeId | None:
     return choices[choice_idx]["id"]
 
 
-@lru_cache(maxsize=1)
 def get_accent_dict(path: str | None = None) -> AccentDict:
 
     if path is None:
-        # load the default pitch accent dict
-        path = os.path.join(get_plugin_dir_path(), "wadoku_pitchdb.csv")
+        # the default pitch accent dict is kept loaded while in use
+        return accent_dict_holder.get()
 
-    acc_dict: AccentDict = {}
-    with open(path, encoding="utf8") as f:
-        for line in f:
-            line_parts = line.strip().split("\u241e")
-            orths_txt: str = line_parts[0]
-            hira: KanaStr = KanaStr(line_parts[1])
-            # hz = line_parts[2]
-            # accs_txt = line_parts[3]
-            patts_txt: str = line_parts[4]
-            orth_txts: list[ExpressionStr] = [
-                ExpressionStr(s) for s in orths_txt.split("\u241f")
-            ]
-            if clean_orth(orth_txts[0]) != orth_txts[0]:
-                orth_txts = [clean_orth(orth_txts[0])] + orth_txts
-            patts: list[PitchAccentNotationPerCharacter] = [
-                PitchAccentNotationPerCharacter(s) for s in patts_txt.split(",")
-            ]
-            patt_common = patts[0]  # TODO: extend to support variants?
-            if is_katakana(orth_txts[0]):
-                hira = hira_to_kata(hira)
-            for orth in orth_txts:
-                if orth not in acc_dict:
-                    acc_dict[orth] = []
-                new = True
-                for patt in acc_dict[orth]:
-                    if patt[0] == hira and patt[1] == patt_common:
-                        new = False
-                        break
-                if new:
-                    acc_dict[orth].append((hira, patt_common))
+    return CompactAccentDict.build(read_accent_dict_entries(path))
+
+
+def load_accent_dict() -> AccentDict:
+    """Load the default pitch accent dict. In order of preference from
+    - the precompiled dict shipped with the add-on, if it was built for
+      this version of the add-on
+    - the binary cache in user_files, if it is up to date with the CSV
+    - the CSV (much slower, updates the cache)
+    """
+
+    artifact_path = os.path.join(get_plugin_dir_path(), dict_artifact_fn)
+    acc_dict = load_compiled_accent_dict(artifact_path, dict_artifact_key())
+    if acc_dict is not None:
+        return acc_dict
+
+    path = os.path.join(get_plugin_dir_path(), "wadoku_pitchdb.csv")
+    try:
+        csv_stat = os.stat(path)
+    except OSError:
+        raise FileNotFoundError(
+            f"pitch dictionary missing ({dict_artifact_fn} can’t be loaded and "
+            "wadoku_pitchdb.csv doesn’t exist), reinstall the add-on"
+        ) from None
+    source_key = f"{csv_stat.st_size}:{csv_stat.st_mtime_ns}"
+    cache_path = get_user_files_path(dict_cache_fn)
+    acc_dict = load_compiled_accent_dict(cache_path, source_key)
+    if acc_dict is not None:
+        return acc_dict
+
+    acc_dict = CompactAccentDict.build(read_accent_dict_entries(path))
+    try:
+        with open(f"{cache_path}.tmp", "wb") as f:
+            acc_dict.dump(f, source_key)
+        os.replace(f"{cache_path}.tmp", cache_path)
+    except OSError:
+        # works without cache, just slower
+        pass
     return acc_dict
 
 
-@lru_cache(maxsize=1)
+def dict_artifact_key() -> str:
+    """Source key of the precompiled dict shipped with the add-on (see
+    tools/compile_dict.py), which is built along with every release.
+    """
+
+    return f"add-on {__version__}"
+
+
+def load_compiled_accent_dict(path: str, source_key: str) -> AccentDict | None:
+    """Load a dict written by CompactAccentDict.dump. None if the file
+    is missing, unreadable, of another format version or was built from
+    other data than source_key.
+    """
+
+    try:
+        with open(path, "rb") as f:
+            return CompactAccentDict.load(f, source_key)
+    except (OSError, ValueError, struct.error, UnicodeDecodeError):
+        return None
+
+
+def read_accent_dict_entries(
+    path: str,
+) -> Iterator[tuple[ExpressionStr, KanaStr, PitchAccentNotationPerCharacter]]:
+    """Read (expression, reading, pattern) entries from the Wadoku
+    pitch accent CSV.
+    """
+
+    with open(path, encoding="utf8") as f:
+        yield from accent_dict_entries(f)
+
+
+def accent_dict_entries(
+    lines: Iterable[str],
+) -> Iterator[tuple[ExpressionStr, KanaStr, PitchAccentNotationPerCharacter]]:
+    """(expression, reading, pattern) entries of lines of the Wadoku
+    pitch accent CSV (e.g. as produced by wadoku_parse).
+    """
+
+    for line in lines:
+        line_parts = line.strip().split("\u241e")
+        orths_txt: str = line_parts[0]
+        hira: KanaStr = KanaStr(line_parts[1])
+        # hz = line_parts[2]
+        # accs_txt = line_parts[3]
+        patts_txt: str = line_parts[4]
+        orth_txts: list[ExpressionStr] = [
+            ExpressionStr(s) for s in orths_txt.split("\u241f")
+        ]
+        if clean_orth(orth_txts[0]) != orth_txts[0]:
+            orth_txts = [clean_orth(orth_txts[0])] + orth_txts
+        patts: list[PitchAccentNotationPerCharacter] = [
+            PitchAccentNotationPerCharacter(s) for s in patts_txt.split(",")
+        ]
+        patt_common = patts[0]  # TODO: extend to support variants?
+        if is_katakana(orth_txts[0]):
+            hira = hira_to_kata(hira)
+        for orth in orth_txts:
+            yield orth, hira, patt_common
+
+
 def get_user_accent_dict(path: str | None = None) -> AccentDict:
 
     if path is None:
-        # load the user custom pitch accent dict
-        path = os.path.join(get_plugin_dir_path(), "user_pitchdb.csv")
-        if not os.path.isfile(path):
-            return {}
+        # the user custom pitch accent dict is kept loaded while in use
+        return user_accent_dict_holder.get()
 
-    acc_dict: AccentDict = {}
+    entries: list[tuple[ExpressionStr, KanaStr, PitchAccentNotationPerMora]] = []
     with open(path, encoding="utf8") as f:
         for line in f:
             line_parts = line.strip().split("\t")
             orth: ExpressionStr = ExpressionStr(line_parts[0])
             hira: KanaStr = KanaStr(line_parts[1])
             patt: PitchAccentNotationPerMora = PitchAccentNotationPerMora(line_parts[2])
-            if orth in acc_dict:
-                acc_dict[orth].append((hira, patt))
-            else:
-                acc_dict[orth] = [(hira, patt)]
-    return acc_dict
+            entries.append((orth, hira, patt))
+    return CompactAccentDict.build(entries)
+
+
+def load_user_accent_dict() -> AccentDict:
+    """Load the user custom pitch accent dict (empty if there is none)."""
+
+    path = os.path.join(get_plugin_dir_path(), "user_pitchdb.csv")
+    if not os.path.isfile(path):
+        return {}
+    return get_user_accent_dict(path)
+
+
+accent_dict_holder = AccentDictHolder("Wadoku", load_accent_dict)
+user_accent_dict_holder = AccentDictHolder("user", load_user_accent_dict)
+
+
+def release_idle_accent_dicts(max_idle: float) -> None:
+    """Release the pitch accent dicts if unused for max_idle seconds."""
+
+    accent_dict_holder.release_if_idle(max_idle)
+    user_accent_dict_holder.release_if_idle(max_idle)
+
+
+def release_accent_dicts_under_pressure(max_rss: int) -> bool:
+    """Release the pitch accent dicts if the Anki process uses more than
+    max_rss bytes of memory and they were not used during the last
+    minute (so that dicts in active use are not reloaded over and over).
+    Returns whether the memory use was above max_rss.
+    """
+
+    rss = process_rss()
+    if rss is None or rss <= max_rss:
+        return False
+    release_idle_accent_dicts(60)
+    return True
+
+
+def release_accent_dicts() -> None:
+    """Release the pitch accent dicts (loaded again on next use)."""
+
+    accent_dict_holder.release()
+    user_accent_dict_holder.release()
 
 
 def get_note_type_ids(deck_id: DeckId) -> list[NotetypeId]:
@@ -243,6 +527,26 @@ def get_note_ids(deck_id: DeckId, note_type_id: NotetypeId) -> list[NoteId]:
     return note_ids
 
 
+def get_note_ids_after(
+    deck_id: DeckId, note_type_id: NotetypeId, last_nid: NoteId | None
+) -> list[NoteId]:
+    """Return the IDs of the notes of the given note type in a deck
+    with an ID greater than last_nid (all if None), in ascending order,
+    with a single query (for resuming a bulk operation).
+    """
+
+    if not mw.col:
+        return []
+
+    return mw.col.db.list(
+        "select distinct c.nid from cards c join notes n on n.id = c.nid"
+        " where c.did = ? and n.mid = ? and c.nid > ? order by c.nid",
+        deck_id,
+        note_type_id,
+        -1 if last_nid is None else last_nid,
+    )
+
+
 def select_note_fields_add(
     note_type_id: NotetypeId,
 ) -> tuple[int, int, int] | tuple[None, None, None]:
@@ -300,44 +604,89 @@ def select_note_fields_del(note_type_id: NotetypeId) -> int | None:
     return del_idx
 
 
-def remove_bracketed_content(dirty: str) -> str:
-    """Remove backets and their contents."""
-
-    clean = re_bracketed_content_patt.sub("", dirty)
-    return clean
+def load_field_mapping(
+    note_type_id: NotetypeId, keys: list[str]
+) -> dict[str, int] | None:
+    """Return the field indices saved for the given note type (e.g. keys
+    "expr_idx", "reading_idx", "output_idx"), or None if not saved for
+    all keys or the saved fields no longer exist.
+    """
 
+    path = get_user_files_path(field_mappings_fn)
+    if not (mw.col and os.path.isfile(path)):
+        return None
+    with open(path, encoding="utf8") as f:
+        saved = json.load(f).get(str(note_type_id), {})
+    note_type: NotetypeDict | None = mw.col.models.get(note_type_id)
+    if not note_type:
+        return None
+    field_names = [fld["name"] for fld in note_type["flds"]]
+    mapping = {}
+    for key in keys:
+        # saved by name, so reordering fields does not break the mapping
+        if saved.get(key) not in field_names:
+            return None
+        mapping[key] = field_names.index(saved[key])
+    return mapping
+
+
+def save_field_mapping(note_type_id: NotetypeId, mapping: dict[str, int]) -> None:
+    """Save the chosen field indices for the given note type (see
+    load_field_mapping).
+    """
 
-def remove_variation_selectors(dirty: str) -> str:
-    """Remove backets and their contents."""
+    if not mw.col:
+        return
+    note_type: NotetypeDict | None = mw.col.models.get(note_type_id)
+    if not note_type:
+        return
+    path = get_user_files_path(field_mappings_fn)
+    saved = {}
+    if os.path.isfile(path):
+        with open(path, encoding="utf8") as f:
+            saved = json.load(f)
+    field_names = [fld["name"] for fld in note_type["flds"]]
+    saved_nt = saved.setdefault(str(note_type_id), {})
+    saved_nt.update({key: field_names[idx] for key, idx in mapping.items()})
+    with open(f"{path}.tmp", "w", encoding="utf8") as f:
+        json.dump(saved, f, ensure_ascii=False, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def group_note_ids_by_note_type(
+    note_ids: list[NoteId],
+) -> dict[NotetypeId, list[NoteId]]:
+    """Group note IDs by note type (with a single query)."""
 
-    clean = re_variation_selectors_patt.sub("", dirty)
-    return clean
+    groups: dict[NotetypeId, list[NoteId]] = {}
+    if not mw.col:
+        return groups
+    for nid, mid in mw.col.db.all(
+        f"select id, mid from notes where id in {ids2str(note_ids)}"
+    ):
+        groups.setdefault(mid, []).append(nid)
+    return groups
 
 
 def clean_japanese_from_note_field(dirty: ExpressionStr) -> ExpressionStr | None:
     """Perform heuristic cleaning of an note field and return
     - the first consecutive string of Japanese if present
+      (see furigana.parse_expression_field)
     - None otherwise
     """
 
-    # heuristic cleaning
-    no_html: str = strip_html(dirty)
-    no_brack_html: str = remove_bracketed_content(no_html)
-    no_varsel_brack_html: str = remove_variation_selectors(no_brack_html)
-    # look for Japanese writing in expression field
-    ja_match = re_ja_patt.search(no_varsel_brack_html)
-    if ja_match:
-        # return rist consecutive match
-        return ExpressionStr(ja_match.group(0))
-    # no Japanese text in field
-    return None
+    parsed = parse_expression_field(dirty)
+    if parsed is None:
+        # no Japanese text in field
+        return None
+    return parsed[0]
 
 
 def get_acc_patt(
     expr_field: ExpressionStr, reading_field: HiraganaStr, dicts: list[AccentDict]
 ) -> ReadingWithPitchPattern | None:
     """Determine the accept pattern for a note given its
-    - expression field
+    - expression field (may include the reading in furigana/ruby notation)
     - reading field
     - accent pattern dictionaries to use for lookup
     """
@@ -358,27 +707,189 @@ def get_acc_patt(
                 continue
         return best
 
-    expr_guess = clean_japanese_from_note_field(expr_field)
-    if expr_guess is None:
-        return None
-    # look for hiragana in reading field
-    hira_match = re_hira_patt.search(reading_field)
-    if hira_match:
-        reading_guess = HiraganaStr(hira_match.group(0))
-    else:
-        reading_guess = HiraganaStr("")
+    guesses = guess_expr_and_reading(expr_field, reading_field)
     # dictionary lookup
-    for dic in dicts:
-        patts = dic.get(expr_guess, None)
-        if patts:
-            return select_best_patt(reading_guess, patts)
+    for expr_guess, reading_guess in guesses:
+        for dic in dicts:
+            patts = dic.get(expr_guess, None)
+            if patts:
+                return select_best_patt(reading_guess, patts)
+    # fall back to looking up the reading (if unambiguous)
+    for expr_guess, reading_guess in guesses:
+        candidates = get_reading_candidates(expr_guess, reading_guess, dicts)
+        if len(candidates) == 1:
+            return candidates[0]
     return None
 
 
+def guess_expr_and_reading(
+    expr_field: ExpressionStr, reading_field: HiraganaStr
+) -> list[tuple[ExpressionStr, HiraganaStr]]:
+    """Determine expressions and readings to look up for a note given
+    its expression and reading field, best guess first (see
+    furigana.parse_expression_candidates). Empty if there is no
+    expression.
+    """
+
+    parsed = parse_expression_candidates(expr_field)
+    # look for hiragana in reading field (which may be in furigana notation
+    # itself), otherwise use the furigana of the expression field (if any)
+    if "[" in reading_field or "<rt" in reading_field:
+        reading_parsed = parse_expression_field(reading_field)
+        if reading_parsed and reading_parsed[1]:
+            reading_field = HiraganaStr(reading_parsed[1])
+    hira_match = re_hira_patt.search(reading_field)
+    guesses = []
+    for expr_guess, expr_reading in parsed:
+        if hira_match:
+            reading_guess = HiraganaStr(hira_match.group(0))
+        else:
+            reading_guess = HiraganaStr(expr_reading)
+        guesses.append((expr_guess, reading_guess))
+    return guesses
+
+
+def get_reading_candidates(
+    expr_guess: ExpressionStr, reading_guess: HiraganaStr, dicts: list[AccentDict]
+) -> list[ReadingWithPitchPattern]:
+    """Look up the reading (or the expression, if it is written in kana)
+    in the reading index of the dictionaries, for expressions that are
+    not in the dictionaries themselves. Returns one (reading, pattern)
+    per distinct pattern found. More than one means the reading is
+    ambiguous.
+    """
+
+    reading = reading_guess
+    if not reading and re_all_kana_patt.match(expr_guess):
+        reading = HiraganaStr(expr_guess)
+    if not reading:
+        return []
+    for dic in dicts:
+        # dictionaries may be combined in a ChainMap (first one takes
+        # precedence)
+        for d in getattr(dic, "maps", [dic]):
+            if not hasattr(d, "lookup_reading"):
+                continue
+            candidates: dict[str, ReadingWithPitchPattern] = {}
+            for hira, patt in d.lookup_reading(reading):
+                LH_patt = char_lvl_patt_to_mora_lvl_patt(patt)
+                candidates.setdefault(LH_patt, (hira, patt))
+            if candidates:
+                return list(candidates.values())
+    return []
+
+
+def count_reading_candidates(
+    expr_field: ExpressionStr, reading_field: HiraganaStr, dicts: list[AccentDict]
+) -> int:
+    """Number of patterns the reading lookup gives for a note whose
+    expression is not in the dictionaries (see get_reading_candidates).
+    """
+
+    guesses = guess_expr_and_reading(expr_field, reading_field)
+    return max(
+        (len(get_reading_candidates(*guess, dicts)) for guess in guesses), default=0
+    )
+
+
+class _LRUCache(OrderedDict):
+    """Minimal size bounded mapping that evicts the least recently
+    used entry once more than maxsize entries are stored.
+    """
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def lookup(self, key, compute):
+        if key in self:
+            self.move_to_end(key)
+            return self[key]
+        val = compute()
+        self[key] = val
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+        return val
+
+
+def get_pitch_batch(
+    pairs: Iterable[tuple[ExpressionStr, HiraganaStr]],
+    dicts: list[AccentDict],
+    cache_size: int = 4096,
+    annotation_format: str | None = "svg",
+) -> Iterator[tuple[PitchAccentDisplayKana, PitchAccentNotationPerMora, str] | None]:
+    """Look up and render pitch accent illustrations for a sequence of
+    (expression field, reading field) pairs.
+
+    Yields one result per input pair in input order, either a tuple
+    (kana, mora level pattern, markup) or None if no pattern was found.
+    The markup is in the given annotation format (see pitch_markup), or
+    None if annotation_format is None (lookup only).
+    Repeated inputs, as well as different inputs resolving to the same
+    kana and pattern, share the lookup and rendering work. At most
+    cache_size results of each kind are kept, so arbitrarily large
+    inputs are processed in bounded memory.
+    """
+
+    lookup_cache = _LRUCache(cache_size)
+    render_cache = _LRUCache(cache_size)
+
+    def render(
+        hira: PitchAccentDisplayKana, LH_patt: PitchAccentNotationPerMora
+    ) -> str | None:
+        if annotation_format is None:
+            return None
+        if annotation_format == "svg":
+            return render_cache.lookup(
+                (hira, LH_patt), lambda: pitch_svg(hira, LH_patt, silent=True)
+            )
+        return render_cache.lookup(
+            (hira, LH_patt), lambda: pitch_markup(hira, LH_patt, annotation_format)
+        )
+
+    def lookup(expr_field: ExpressionStr, reading_field: HiraganaStr):
+        patt = get_acc_patt(
+            ExpressionStr(expr_field.strip()), HiraganaStr(reading_field.strip()), dicts
+        )
+        if not patt:
+            return None
+        hira: PitchAccentDisplayKana = patt[0]
+        LH_patt = char_lvl_patt_to_mora_lvl_patt(patt[1])
+        return hira, LH_patt, render(hira, LH_patt)
+
+    for expr_field, reading_field in pairs:
+        yield lookup_cache.lookup(
+            (expr_field, reading_field), lambda: lookup(expr_field, reading_field)
+        )
+
+
+def accent_block(content: str, user_set: bool, fingerprint: str | None = None) -> str:
+    """Surround content with the (auto or user set) pitch accent
+    annotation markers. The start marker carries the fingerprint
+    of the annotation, if given.
+    """
+
+    if user_set:
+        tag_prefix = "user_"
+    else:
+        tag_prefix = ""
+    fp = f" {fingerprint}" if fingerprint else ""
+
+    return (
+        f"<!-- {tag_prefix}accent_start{fp} -->"
+        f"{content}"
+        f"<!-- {tag_prefix}accent_end -->"
+    )
+
+
 def add_pitch_to_field_content(
-    field_content: str, pitch_svg: SvgStr, user_set: bool
+    field_content: str,
+    pitch_svg: SvgStr | str,
+    user_set: bool,
+    fingerprint: str | None = None,
 ) -> str:
-    """Combines the existing field_content with the pitch_svg and returns the result.
+    """Combines the existing field_content with the pitch_svg (or data only
+    annotation markup) and returns the result.
 
     To enable automated removal, pitch_svg is surrounded with HTML comment markers.
     If field_content is non-empty, a separator is added inbetween it and the pitch annotation.
@@ -392,17 +903,166 @@ def add_pitch_to_field_content(
     else:
         separator = ""
 
-    if user_set:
-        tag_prefix = "user_"
-    else:
-        tag_prefix = ""
+    return f"{field_content}" + accent_block(
+        f"{separator}{pitch_svg}", user_set, fingerprint
+    )
 
-    return (
-        f"{field_content}"
-        f"<!-- {tag_prefix}accent_start -->"
-        f"{separator}{pitch_svg}"
-        f"<!-- {tag_prefix}accent_end -->"
+
+def pitch_annotation(
+    hira: PitchAccentDisplayKana,
+    LH_patt: PitchAccentNotationPerMora,
+    annotation_format: str,
+    media_written: set[str] | None = None,
+    silent: bool = False,
+) -> tuple[str, str]:
+    """Return markup and fingerprint of a pitch accent annotation.
+
+    For the "media" format, the illustration file is written to the
+    collection media folder if it does not exist yet. Pass the same
+    media_written set for a whole run to check each file only once.
+    """
+
+    markup = pitch_markup(hira, LH_patt, annotation_format, silent)
+    fingerprint = pitch_fingerprint(hira, LH_patt, annotation_format)
+    if annotation_format == "media":
+        if media_written is None:
+            media_written = set()
+        key = f"{hira}\x1f{LH_patt}"
+        if key not in media_written:
+            write_pitch_media_file(hira, LH_patt)
+            media_written.add(key)
+    return markup, fingerprint
+
+
+def write_pitch_media_file(
+    hira: PitchAccentDisplayKana, LH_patt: PitchAccentNotationPerMora
+) -> None:
+    """Add the illustration file of a media annotation to the collection
+    media folder (unless present, file names are content hashes).
+    """
+
+    if not mw.col:
+        return
+    file_name, data = pitch_svg_file(hira, LH_patt)
+    if not os.path.exists(os.path.join(mw.col.media.dir(), file_name)):
+        mw.col.media.write_data(file_name, data)
+
+
+def clean_pitch_media() -> tuple[int, int]:
+    """Move illustration files no longer referenced by any note to
+    Anki’s media trash.
+
+    Returns the number of files and bytes removed.
+    """
+
+    if not mw.col:
+        return 0, 0
+    media_dir = mw.col.media.dir()
+    media_files = [
+        fn for fn in os.listdir(media_dir) if re_pitch_media_fn_patt.match(fn)
+    ]
+    if not media_files:
+        return 0, 0
+    # any mention of a file counts, even if the markup was changed (e.g.
+    # attributes reordered by the editor)
+    used: set[str] = set()
+    for (flds,) in mw.col.db.all("select flds from notes where flds like '%.svg%'"):
+        used.update(re_pitch_media_ref_patt.findall(flds))
+    unused = [fn for fn in media_files if fn not in used]
+    num_bytes = sum(os.path.getsize(os.path.join(media_dir, fn)) for fn in unused)
+    if unused:
+        mw.col.media.trash_files(unused)
+    return len(unused), num_bytes
+
+
+def pitch_storage_size() -> tuple[int, int, int]:
+    """Return the space taken up by pitch accent annotations: bytes in
+    note fields, and number and bytes of illustration media files.
+    """
+
+    if not mw.col:
+        return 0, 0, 0
+    num_field_bytes = 0
+    for (flds,) in mw.col.db.all(
+        "select flds from notes where flds like '%accent_start%'"
+    ):
+        num_field_bytes += sum(
+            len(match.group(0).encode("utf8"))
+            for match in re_accent_block_patt.finditer(flds)
+        )
+    media_dir = mw.col.media.dir()
+    media_files = [
+        fn for fn in os.listdir(media_dir) if re_pitch_media_fn_patt.match(fn)
+    ]
+    num_media_bytes = sum(
+        os.path.getsize(os.path.join(media_dir, fn)) for fn in media_files
+    )
+    return num_field_bytes, len(media_files), num_media_bytes
+
+
+def get_note_fields(
+    note_ids: list[NoteId],
+) -> list[tuple[NoteId, int, list[str]]]:
+    """Read the raw fields of the given notes with a single query on the
+    notes table (instead of loading full Note objects).
+
+    Returns (note ID, modification time, fields) tuples ordered by ID.
+    """
+
+    if not mw.col:
+        return []
+
+    rows = mw.col.db.all(
+        f"select id, mod, flds from notes where id in {ids2str(note_ids)} order by id"
     )
+    return [(nid, mod, flds.split("\x1f")) for nid, mod, flds in rows]
+
+
+def iter_note_field_chunks(
+    note_ids: list[NoteId], chunk_size: int
+) -> Iterator[tuple[list[NoteId], list[tuple[NoteId, int, list[str]]]]]:
+    """Yield chunks of the given note IDs in ascending order together
+    with the raw fields of the notes in the chunk (see get_note_fields).
+    """
+
+    sorted_ids = sorted(note_ids)
+    for i in range(0, len(sorted_ids), chunk_size):
+        chunk_ids = sorted_ids[i : i + chunk_size]
+        yield chunk_ids, get_note_fields(chunk_ids)
+
+
+def iter_annotated_note_chunks(
+    chunk_size: int,
+) -> Iterator[list[tuple[NoteId, NotetypeId, int, str]]]:
+    """Yield the (note ID, note type ID, modification time, raw fields)
+    of all notes with pitch accent annotations in chunks, in ascending
+    ID order.
+    """
+
+    last_nid = -1
+    while True:
+        rows = mw.col.db.all(
+            "select id, mid, mod, flds from notes"
+            " where id > ? and flds like '%accent_start%' order by id limit ?",
+            last_nid,
+            chunk_size,
+        )
+        if not rows:
+            return
+        yield rows
+        last_nid = rows[-1][0]
+
+
+def get_unchanged_note(nid: NoteId, mod: int) -> Note | None:
+    """Load a note whose fields were read (by get_note_fields) at
+    modification time mod. Returns None if the note was modified since
+    (e.g. in the editor), so that the change isn’t overwritten.
+    """
+
+    note = mw.col.get_note(nid)
+    if note.mod != mod:
+        return None
+    return note
 
 
 def add_pitch(
@@ -411,60 +1071,127 @@ def add_pitch(
     expr_idx: int,
     reading_idx: int,
     output_idx: int,
+    annotation_format: str = "svg",
+    checkpoint: dict | None = None,
+    chunk_size: int = 500,
 ):
-    """Add pitch accent illustration to notes.
-
-    Returns stats on how it went.
+    """Add pitch accent illustration to notes (as SVG or, with
+    annotation_format "data", as data only markup to be drawn by
+    the client side renderer, or with "media" as reference to an
+    SVG file in the media folder shared by identical illustrations).
+
+    Notes are processed in ascending ID order and saved in chunks. If
+    checkpoint parameters are given, they are saved along with the last
+    processed note ID after every chunk, so that an interrupted run can
+    be resumed. Fields are read in bulk, Note objects are only created
+    for notes that are changed. Notes modified after their fields were
+    read are left as is.
+
+    Expressions not in the dictionary are looked up by their reading.
+    Notes for which that gives several patterns are left as is and
+    listed separately (with the number of candidate patterns).
+
+    Returns stats on how it went, and the change set (also passed to
+    the changes.notes_did_change hook).
     """
 
     not_found_list: list[tuple[NoteId, ExpressionStr]] = []
+    ambiguous_list: list[tuple[NoteId, ExpressionStr, int]] = []
     num_updated: int = 0
     num_already_done: int = 0
     num_svg_fail: int = 0
+    change_set = ChangeSet("add")
 
     if not mw.col:
-        return not_found_list, num_updated, num_already_done, num_svg_fail
-
-    for nid in note_ids:
-        # set up note access
-        note: Note = mw.col.get_note(nid)
-        expr_fld: str = note.keys()[expr_idx]
-        reading_fld: str = note.keys()[reading_idx]
-        output_fld: str = note.keys()[output_idx]
-        # check for existing illustrations
-        has_auto_accent: bool = "<!-- accent_start -->" in note[output_fld]
-        has_manual_accent: bool = "<!-- user_accent_start -->" in note[output_fld]
-        if has_auto_accent or has_manual_accent:
-            # already has a pitch accent illustration
-            num_already_done += 1
-            continue
-        # determine accent pattern
-        expr_field: ExpressionStr = ExpressionStr(note[expr_fld].strip())
-        reading_field: HiraganaStr = HiraganaStr(note[reading_fld].strip())
-        patt: ReadingWithPitchPattern | None = get_acc_patt(
-            expr_field, reading_field, [acc_dict]
+        return (
+            not_found_list,
+            num_updated,
+            num_already_done,
+            num_svg_fail,
+            ambiguous_list,
+            change_set,
         )
-        if not patt:
-            not_found_list.append((nid, expr_field))
-            continue
-        hira: PitchAccentDisplayKana = patt[0]
-        LlHh_patt: PitchAccentNotation = patt[1]
-        LH_patt: PitchAccentNotationPerMora = char_lvl_patt_to_mora_lvl_patt(LlHh_patt)
-        # generate SVG for accent pattern
-        svg = pitch_svg(hira, LH_patt)
-        # extend and save note
-        note[output_fld] = add_pitch_to_field_content(note[output_fld], svg, False)
-        mw.col.update_note(note)
-        num_updated += 1
-    return not_found_list, num_updated, num_already_done, num_svg_fail
+
+    # illustration files written in this run (media annotations)
+    media_written: set[str] = set()
+    if checkpoint is not None:
+        save_checkpoint(checkpoint, None)
+    for chunk_ids, chunk_fields in iter_note_field_chunks(note_ids, chunk_size):
+        chunk: list[Note] = []
+        for nid, mod, fields in chunk_fields:
+            output_val: str = fields[output_idx]
+            # check for existing illustrations
+            has_auto_accent: bool = "<!-- accent_start" in output_val
+            has_manual_accent: bool = "<!-- user_accent_start" in output_val
+            if has_auto_accent or has_manual_accent:
+                # already has a pitch accent illustration
+                num_already_done += 1
+                change_set.skip(nid)
+                continue
+            # determine accent pattern
+            expr_field: ExpressionStr = ExpressionStr(fields[expr_idx].strip())
+            reading_field: HiraganaStr = HiraganaStr(fields[reading_idx].strip())
+            patt: ReadingWithPitchPattern | None = get_acc_patt(
+                expr_field, reading_field, [acc_dict]
+            )
+            if not patt:
+                num_candidates = count_reading_candidates(
+                    expr_field, reading_field, [acc_dict]
+                )
+                if num_candidates > 1:
+                    ambiguous_list.append((nid, expr_field, num_candidates))
+                else:
+                    not_found_list.append((nid, expr_field))
+                change_set.skip(nid)
+                continue
+            hira: PitchAccentDisplayKana = patt[0]
+            LlHh_patt: PitchAccentNotation = patt[1]
+            LH_patt: PitchAccentNotationPerMora = char_lvl_patt_to_mora_lvl_patt(
+                LlHh_patt
+            )
+            # generate annotation for accent pattern
+            markup, fingerprint = pitch_annotation(
+                hira, LH_patt, annotation_format, media_written
+            )
+            # extend note
+            note = get_unchanged_note(nid, mod)
+            if note is None:
+                change_set.skip(nid)
+                continue
+            note.fields[output_idx] = add_pitch_to_field_content(
+                output_val, markup, False, fingerprint
+            )
+            change_set.record(nid, output_idx, output_val, note.fields[output_idx])
+            chunk.append(note)
+            num_updated += 1
+        commit_chunk(chunk, checkpoint, chunk_ids[-1])
+    if checkpoint is not None:
+        clear_checkpoint()
+    run_notes_did_change(change_set)
+    return (
+        not_found_list,
+        num_updated,
+        num_already_done,
+        num_svg_fail,
+        ambiguous_list,
+        change_set,
+    )
 
 
 def remove_pitch(
-    note_ids: list[NoteId], del_idx: int, user_set: bool = False
-) -> tuple[int, int]:
+    note_ids: list[NoteId],
+    del_idx: int,
+    user_set: bool = False,
+    checkpoint: dict | None = None,
+    chunk_size: int = 500,
+) -> tuple[int, int, ChangeSet]:
     """Remove pitch accent illustrations from a specified field.
 
-    Returns stats on how that went.
+    Notes are read, processed and saved in chunks like in add_pitch
+    (including the optional checkpointing).
+
+    Returns stats on how that went, and the change set (also passed to
+    the changes.notes_did_change hook).
     """
 
     # determine accent pattern to search for
@@ -473,27 +1200,249 @@ def remove_pitch(
     else:
         tag_prefix = ""
     acc_patt = re.compile(
-        rf"<!-- {tag_prefix}accent_start -->.+<!-- {tag_prefix}accent_end -->",
+        rf"<!-- {tag_prefix}accent_start[^>]*-->.+<!-- {tag_prefix}accent_end -->",
         re.S,
     )
     num_updated = 0
     num_already_done = 0
+    change_set = ChangeSet("remove")
+    if not mw.col:
+        return num_already_done, num_updated, change_set
+    if checkpoint is not None:
+        save_checkpoint(checkpoint, None)
+    for chunk_ids, chunk_fields in iter_note_field_chunks(note_ids, chunk_size):
+        chunk: list[Note] = []
+        for nid, mod, fields in chunk_fields:
+            # check for cards w/o accent illustrations
+            if f" {tag_prefix}accent_start" not in fields[del_idx]:
+                # has no pitch accent illustration
+                num_already_done += 1
+                change_set.skip(nid)
+                continue
+            # update note
+            note = get_unchanged_note(nid, mod)
+            if note is None:
+                change_set.skip(nid)
+                continue
+            note.fields[del_idx] = re.sub(acc_patt, "", fields[del_idx])
+            change_set.record(nid, del_idx, fields[del_idx], note.fields[del_idx])
+            chunk.append(note)
+            num_updated += 1
+        commit_chunk(chunk, checkpoint, chunk_ids[-1])
+    if checkpoint is not None:
+        clear_checkpoint()
+    run_notes_did_change(change_set)
+    return num_already_done, num_updated, change_set
+
+
+def refresh_pitch(
+    acc_dict: AccentDict,
+    note_ids: list[NoteId],
+    expr_idx: int,
+    reading_idx: int,
+    output_idx: int,
+    annotation_format: str = "svg",
+    chunk_size: int = 500,
+) -> tuple[int, int, int, int, ChangeSet]:
+    """Re-generate automatically added pitch accent illustrations whose
+    fingerprint does not match the current lookup result (e.g. after a
+    dictionary or add-on update). Up to date notes are left untouched.
+
+    Returns the number of notes without automatically added illustration,
+    already up to date, updated, and no longer found in the dictionary,
+    and the change set (also passed to the changes.notes_did_change hook).
+    """
+
+    num_unannotated = 0
+    num_up_to_date = 0
+    num_updated = 0
+    num_not_found = 0
+    change_set = ChangeSet("refresh")
     if not mw.col:
-        return num_already_done, num_updated
-    for nid in note_ids:
-        # set up note access
-        note = mw.col.get_note(nid)
-        del_fld = note.keys()[del_idx]
-        # check for cards w/o accent illustrations
-        if f" {tag_prefix}accent_start" not in note[del_fld]:
-            # has no pitch accent illustration
-            num_already_done += 1
-            continue
-        # update and save note
-        note[del_fld] = re.sub(acc_patt, "", note[del_fld])
-        mw.col.update_note(note)
-        num_updated += 1
-    return num_already_done, num_updated
+        return (
+            num_unannotated,
+            num_up_to_date,
+            num_updated,
+            num_not_found,
+            change_set,
+        )
+
+    media_written: set[str] = set()
+    for chunk_ids, chunk_fields in iter_note_field_chunks(note_ids, chunk_size):
+        chunk: list[Note] = []
+        for nid, mod, fields in chunk_fields:
+            output_val: str = fields[output_idx]
+            block_match = None
+            for match in re_accent_block_patt.finditer(output_val):
+                if match.group(1) is None:
+                    # automatically added (not user set)
+                    block_match = match
+                    break
+            if block_match is None:
+                num_unannotated += 1
+                change_set.skip(nid)
+                continue
+            expr_field: ExpressionStr = ExpressionStr(fields[expr_idx].strip())
+            reading_field: HiraganaStr = HiraganaStr(fields[reading_idx].strip())
+            patt: ReadingWithPitchPattern | None = get_acc_patt(
+                expr_field, reading_field, [acc_dict]
+            )
+            if not patt:
+                num_not_found += 1
+                change_set.skip(nid)
+                continue
+            hira: PitchAccentDisplayKana = patt[0]
+            LH_patt: PitchAccentNotationPerMora = char_lvl_patt_to_mora_lvl_patt(
+                patt[1]
+            )
+            fingerprint = pitch_fingerprint(hira, LH_patt, annotation_format)
+            if block_match.group(2) == fingerprint:
+                num_up_to_date += 1
+                change_set.skip(nid)
+                continue
+            # replace stale annotation
+            markup, _ = pitch_annotation(
+                hira, LH_patt, annotation_format, media_written
+            )
+            new_block = accent_block(
+                replace_pitch_markup(block_match.group(3), markup), False, fingerprint
+            )
+            note = get_unchanged_note(nid, mod)
+            if note is None:
+                change_set.skip(nid)
+                continue
+            note.fields[output_idx] = (
+                output_val[: block_match.start()]
+                + new_block
+                + output_val[block_match.end() :]
+            )
+            change_set.record(nid, output_idx, output_val, note.fields[output_idx])
+            chunk.append(note)
+            num_updated += 1
+        commit_chunk(chunk, None, chunk_ids[-1])
+    run_notes_did_change(change_set)
+    return num_unannotated, num_up_to_date, num_updated, num_not_found, change_set
+
+
+def rerender_pitch_markup(
+    field_content: str,
+    annotation_format: str,
+    media_written: set[str] | None = None,
+) -> str:
+    """Re-render all pitch accent annotations in field_content in the
+    given annotation format, leaving separators as is.
+    """
+
+    def rerender_block(match: re.Match) -> str:
+        tag_prefix, _, content = match.groups()
+        parsed = parse_pitch_markup(content)
+        if parsed is None:
+            return match.group(0)
+        hira, LH_patt = parsed
+        # existing (e.g. legacy) annotations may have invalid patterns
+        markup, fingerprint = pitch_annotation(
+            hira, LH_patt, annotation_format, media_written, silent=True
+        )
+        return accent_block(
+            replace_pitch_markup(content, markup), bool(tag_prefix), fingerprint
+        )
+
+    return re_accent_block_patt.sub(rerender_block, field_content)
+
+
+def replace_pitch_markup(content: str, markup: str) -> str:
+    """Replace the pitch accent annotation (in any format) within the
+    content of an annotation block by markup.
+    """
+
+    separator = content
+    for patt in (re_pitch_svg_patt, re_pitch_data_patt, re_pitch_media_patt):
+        separator = patt.sub("", separator)
+    return f"{separator}{markup}"
+
+
+def migrate_pitch(
+    annotation_format: str, chunk_size: int = 500
+) -> tuple[int, int, int, ChangeSet]:
+    """Re-render all existing pitch accent annotations in the collection
+    in the given annotation format. Notes are read and saved in chunks.
+
+    Returns the number of notes checked, the number of notes updated,
+    the number of bytes saved, and the change set (also passed to the
+    changes.notes_did_change hook).
+    """
+
+    num_checked = 0
+    num_updated = 0
+    bytes_saved = 0
+    change_set = ChangeSet("migrate")
+    if not mw.col:
+        return num_checked, num_updated, bytes_saved, change_set
+
+    note_type_ids: set[NotetypeId] = set()
+    media_written: set[str] = set()
+    for rows in iter_annotated_note_chunks(chunk_size):
+        chunk: list[Note] = []
+        for nid, mid, mod, flds in rows:
+            num_checked += 1
+            fields = flds.split("\x1f")
+            new_fields = [
+                rerender_pitch_markup(fld, annotation_format, media_written)
+                for fld in fields
+            ]
+            if new_fields == fields:
+                change_set.skip(nid)
+                continue
+            note = get_unchanged_note(nid, mod)
+            if note is None:
+                # modified in the meantime
+                change_set.skip(nid)
+                continue
+            for field_idx, (old, new) in enumerate(zip(fields, new_fields)):
+                if new != old:
+                    change_set.record(nid, field_idx, old, new)
+            bytes_saved += len(flds.encode()) - len("\x1f".join(new_fields).encode())
+            note.fields = new_fields
+            chunk.append(note)
+            if mid not in note_type_ids:
+                # templates need to render the new format before any
+                # note is saved with it (in case the run is interrupted)
+                prepare_note_type(mid, annotation_format)
+                note_type_ids.add(mid)
+        if chunk:
+            mw.col.update_notes(chunk)
+            num_updated += len(chunk)
+    run_notes_did_change(change_set)
+    return num_checked, num_updated, bytes_saved, change_set
+
+
+def count_accent_types(deck_id: DeckId) -> dict[str, int]:
+    """Count the pitch accent annotations in the notes of a deck by
+    accent type (see draw_pitch.accent_types, annotations without a
+    valid pattern are counted as "other").
+    """
+
+    counts = dict.fromkeys(accent_types + ("other",), 0)
+    if not mw.col:
+        return counts
+
+    rows = mw.col.db.all(
+        "select flds from notes where flds like '%accent_start%' and id in"
+        " (select nid from cards where did = ?)",
+        deck_id,
+    )
+    for (flds,) in rows:
+        for match in re_accent_block_patt.finditer(flds):
+            content = match.group(3)
+            # SVGs carry their type as class, only parse other annotations
+            type_match = re_pitch_svg_type_patt.search(content)
+            if type_match:
+                acc_type = type_match.group(1)
+            else:
+                parsed = parse_pitch_markup(content)
+                acc_type = accent_type(parsed[1]) if parsed else None
+            counts[acc_type if acc_type in counts else "other"] += 1
+    return counts
 
 
 def hira_to_kata(s: KanaStr) -> KanaStr:
@@ -545,8 +1494,8 @@ def clean_orth(orth: str) -> ExpressionStr:
     # change affix indicator from ellipsis (as used in Wadoku)
     # to wave dash (as used by the author in Anki)
     # (NOTE: the current preprocessing used for Japanese expressions
-    #  is done in clean_japanese_from_note_field using the pattern
-    #  re_ja_patt, which does not include '…' and '〜'. This means
+    #  is done in clean_japanese_from_note_field using the character
+    #  class of re_ja_patt, which does not include '…' and '〜'. This means
     #  the replacement below does have no effect. Keeping it in for
     #  the moment anyway in case affix markers become relevant in
     #  the future)
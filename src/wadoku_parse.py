@@ -0,0 +1,141 @@
+"""Conversion of a Wadoku XML dump into the pitch accent database
+read by util.get_accent_dict.
+
+The dump is parsed incrementally, one <entry> at a time, so memory use
+stays constant regardless of the dump’s size.
+
+Output format (one line per entry with accent information):
+orthographies (U+241F separated) U+241E hiragana U+241E hatsuon U+241E
+accents (comma separated) U+241E patterns (comma separated)
+"""
+
+import os
+import xml.etree.ElementTree as ET
+from collections.abc import Callable, Iterator
+from typing import BinaryIO, TextIO
+from .draw_pitch import hira_to_mora
+from .types import KanaStr, PitchAccentNotationPerCharacter
+
+# (number of entries processed, bytes read, total bytes)
+ProgressCallback = Callable[[int, int, int], None]
+
+
+def local_name(tag: str) -> str:
+    """Strip the XML namespace from a tag."""
+
+    return tag.rsplit("}", 1)[-1]
+
+
+def is_kana(ch: str) -> bool:
+    return "ぁ" <= ch <= "ゖ" or "ァ" <= ch <= "ヺ" or ch == "ー"
+
+
+def accent_to_patt(kana: KanaStr, accent: int) -> PitchAccentNotationPerCharacter:
+    """Character level pitch accent notation for a word given its
+    accent position (0: heiban, 1: atamadaka, n: drop after mora n).
+    Includes the pitch of a following particle as last position.
+
+    Example:
+    しゅん, 0
+    Out: LlHH
+    """
+
+    patt = ""
+    mora = hira_to_mora(kana)
+    for i, mor in enumerate(mora):
+        if accent == 0:
+            high = i > 0
+        elif accent == 1:
+            high = i == 0
+        else:
+            high = 0 < i < accent
+        level = "H" if high else "L"
+        # second kana of 拗音 in lower case
+        patt += level + level.lower() * (len(mor) - 1)
+    patt += "H" if accent == 0 else "L"
+    return PitchAccentNotationPerCharacter(patt)
+
+
+def parse_entry(entry: ET.Element) -> str | None:
+    """Return the pitch accent database line for an <entry> element,
+    or None if it has no (usable) accent information.
+    """
+
+    orths: list[str] = []
+    hira = ""
+    hatsuon = ""
+    accents: list[int] = []
+    for elem in entry.iter():
+        tag = local_name(elem.tag)
+        text = (elem.text or "").strip()
+        if tag == "orth" and text and text not in orths:
+            orths.append(text)
+        elif tag == "hira" and not hira:
+            hira = text
+        elif tag == "hatsuon" and not hatsuon:
+            hatsuon = text
+        elif tag == "accent" and text.isdigit():
+            accents.append(int(text))
+    if not orths or not hira or not accents:
+        return None
+    # hatsuon contains additional markers (word boundaries etc.)
+    kana = KanaStr("".join(ch for ch in (hatsuon or hira) if is_kana(ch)))
+    patts = [accent_to_patt(kana, acc) for acc in accents]
+    return "␞".join(
+        [
+            "␟".join(orths),
+            hira,
+            hatsuon,
+            ",".join(str(acc) for acc in accents),
+            ",".join(patts),
+        ]
+    )
+
+
+def iter_pitchdb_lines(
+    xml_file: BinaryIO,
+    progress: ProgressCallback | None = None,
+    progress_every: int = 10000,
+) -> Iterator[str]:
+    """Stream the pitch accent database lines for a Wadoku XML dump."""
+
+    try:
+        total = os.fstat(xml_file.fileno()).st_size
+    except (AttributeError, OSError):
+        total = 0
+    num_entries = 0
+    root = None
+    for event, elem in ET.iterparse(xml_file, events=("start", "end")):
+        if root is None:
+            root = elem
+        if event != "end" or local_name(elem.tag) != "entry":
+            continue
+        line = parse_entry(elem)
+        if line is not None:
+            yield line
+        # free processed entries
+        elem.clear()
+        root.clear()
+        num_entries += 1
+        if progress is not None and num_entries % progress_every == 0:
+            progress(num_entries, xml_file.tell(), total)
+    if progress is not None:
+        progress(num_entries, total, total)
+
+
+def convert(
+    xml_path: str,
+    out_file: TextIO,
+    progress: ProgressCallback | None = None,
+) -> int:
+    """Convert the Wadoku XML dump at xml_path into the pitch accent
+    database format, written to out_file. Returns the number of lines
+    written.
+    """
+
+    num_lines = 0
+    with open(xml_path, "rb") as f:
+        for line in iter_pitchdb_lines(f, progress):
+            out_file.write(f"{line}\n")
+            num_lines += 1
+    return num_lines
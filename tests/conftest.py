@@ -0,0 +1,13 @@
+"""Make the add-on importable as japanese_pitch_accent, with the
+stand-ins for aqt and anki from tools/stubs (see tools/_addon.py).
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "tools"))
+
+from _addon import load_addon, use_anki_stubs  # noqa: E402
+
+use_anki_stubs()
+load_addon()
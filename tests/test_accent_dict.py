@@ -0,0 +1,116 @@
+import io
+
+import pytest
+
+from japanese_pitch_accent.accent_dict import CompactAccentDict
+from japanese_pitch_accent.util import accent_dict_entries
+
+# lines of the Wadoku pitch accent CSV (see wadoku_parse)
+csv_lines = [
+    "旬␞しゅん␞しゅん␞0␞LlHH",
+    "春夏秋冬␞しゅんかしゅうとう␞しゅんか･しゅうとう␞5␞LlHHHhHLLL",
+    "橋␟箸␞はし␞はし␞1␞HhLl",
+    "端␞はし␞はし␞0␞LlHh",
+    "箸␞はし␞はし␞1␞HhLl",
+    "(お)茶␞おちゃ␞お･ちゃ␞0␞LlHh",
+    "パン␞ぱん␞パン␞1␞HhLl",
+    "日本␞にほん␞にほん␞2␞LlHhLl",
+    "日本␞にっぽん␞にっぽん␞3␞LlHHhLl",
+    "日本␞にほん␞にほん␞2␞LlHhLl",
+    "今日␟今日␞きょう␞きょう␞1␞HHhL",
+]
+
+
+def reference_dict(entries):
+    """Dictionary as built before CompactAccentDict: expression ->
+    list of distinct (reading, pattern) tuples in order of appearance.
+    """
+
+    acc_dict = {}
+    for orth, hira, patt in entries:
+        patts = acc_dict.setdefault(orth, [])
+        if (hira, patt) not in patts:
+            patts.append((hira, patt))
+    return acc_dict
+
+
+def assert_same_lookups(compact, reference):
+    assert len(compact) == len(reference)
+    assert set(compact) == set(reference)
+    for orth, patts in reference.items():
+        assert orth in compact
+        assert compact[orth] == patts
+        assert compact.get(orth) == patts
+    assert "猫" not in compact
+    assert compact.get("猫") is None
+    with pytest.raises(KeyError):
+        compact["猫"]
+
+
+@pytest.fixture
+def entries():
+    return list(accent_dict_entries(csv_lines))
+
+
+def test_build(entries):
+    assert_same_lookups(CompactAccentDict.build(entries), reference_dict(entries))
+
+
+def test_lookup_reading(entries):
+    compact = CompactAccentDict.build(entries)
+    assert sorted(compact.lookup_reading("はし")) == [
+        ("はし", "HhLl"),
+        ("はし", "LlHh"),
+    ]
+    # hiragana and katakana are not distinguished
+    assert compact.lookup_reading("パン") == [("パン", "HhLl")]
+    assert compact.lookup_reading("ねこ") == []
+
+
+def test_dump_load(entries):
+    compact = CompactAccentDict.build(entries)
+    f = io.BytesIO()
+    compact.dump(f, "key")
+    f.seek(0)
+    loaded = CompactAccentDict.load(f, "key")
+    assert loaded is not None
+    assert_same_lookups(loaded, reference_dict(entries))
+    assert sorted(loaded.lookup_reading("はし")) == sorted(
+        compact.lookup_reading("はし")
+    )
+    for patts in reference_dict(entries).values():
+        for _, patt in patts:
+            mora_patt = patt.replace("l", "").replace("h", "")
+            assert loaded.accent_type(mora_patt) == compact.accent_type(mora_patt)
+
+
+def test_load_wrong_key(entries):
+    f = io.BytesIO()
+    CompactAccentDict.build(entries).dump(f, "key")
+    f.seek(0)
+    assert CompactAccentDict.load(f, "other key") is None
+
+
+def test_load_wrong_version(entries):
+    f = io.BytesIO()
+    CompactAccentDict.build(entries).dump(f, "key")
+    data = bytearray(f.getvalue())
+    data[len(CompactAccentDict.file_magic)] += 1
+    assert CompactAccentDict.load(io.BytesIO(bytes(data)), "key") is None
+
+
+def test_empty():
+    compact = CompactAccentDict.build([])
+    assert len(compact) == 0
+    assert compact.get("日本") is None
+    assert compact.lookup_reading("にほん") == []
+    f = io.BytesIO()
+    compact.dump(f)
+    f.seek(0)
+    loaded = CompactAccentDict.load(f)
+    assert loaded is not None
+    assert len(loaded) == 0
+    assert list(loaded) == []
+    assert loaded.get("日本") is None
+    assert loaded.lookup_reading("にほん") == []
+    assert loaded.lookup_reading("") == []
@@ -0,0 +1,70 @@
+import pytest
+
+from japanese_pitch_accent.furigana import (
+    parse_expression_candidates,
+    parse_expression_field,
+)
+
+
+@pytest.mark.parametrize(
+    "field, expected",
+    [
+        # no furigana
+        ("日本語", ("日本語", "")),
+        ("<b>日本語</b> (Japanese)", ("日本語", "")),
+        ("日本 語", ("日本", "")),
+        ("猫<!-- comment -->", ("猫", "")),
+        # furigana
+        ("日本語[にほんご]", ("日本語", "にほんご")),
+        ("食[た]べる", ("食べる", "たべる")),
+        ("食[た]べ物", ("食べ物", "")),
+        ("橋[はし];<b>test</b>", ("橋", "はし")),
+        ("橋[はし,0]", ("橋", "はし")),
+        # ruby
+        ("<ruby>橋<rt>はし</rt></ruby>を", ("橋を", "はしを")),
+        ("<ruby>漢字<rp>(</rp><rt>かんじ</rt><rp>)</rp></ruby>", ("漢字", "かんじ")),
+        ("<RUBY>橋<RT>はし</RT></RUBY>", ("橋", "はし")),
+        # bracketed content
+        ("(お)茶[ちゃ]", ("茶", "ちゃ")),
+        ("猫[ねこ] (cat)", ("猫", "ねこ")),
+        # entities
+        ("&#26085;本[にほん]", ("日本", "にほん")),
+        ("猫[ねこ]&nbsp;です", ("猫", "ねこ")),
+        ("&lt;猫[ねこ]&gt;", ("猫", "ねこ")),
+        # sound
+        ("[sound:neko.mp3] 猫[ねこ]", ("猫", "ねこ")),
+        ("猫[ねこ][sound:neko.mp3]", ("猫", "ねこ")),
+        ("日本 語 [sound:nihongo.mp3]", ("日本", "")),
+        # multiple words
+        (" 食[た]べ 物[もの]", ("食べ物", "たべもの")),
+        (" お 母[かあ]さん", ("お母さん", "おかあさん")),
+        ("行[い]く 人[ひと] です", ("行く人", "いくひと")),
+        ("猫[ねこ] cat", ("猫", "ねこ")),
+        # no Japanese
+        ("cat", None),
+        ("[sound:neko.mp3]", None),
+        ("", None),
+    ],
+)
+def test_parse_expression_field(field, expected):
+    assert parse_expression_field(field) == expected
+
+
+@pytest.mark.parametrize(
+    "field, expected",
+    [
+        ("猫[ねこ]", [("猫", "ねこ")]),
+        ("行[い]く 人[ひと] です", [("行く人", "いくひと"), ("行く", "いく")]),
+        (
+            "今日[きょう]は 雨[あめ]",
+            [("今日は雨", "きょうはあめ"), ("今日は", "きょうは")],
+        ),
+        (" 食[た]べ 物[もの]", [("食べ物", "たべもの"), ("食べ", "たべ")]),
+        # first word has no furigana
+        (" お 母[かあ]さん", [("お母さん", "おかあさん")]),
+        ("日本 語", [("日本", "")]),
+        ("cat", []),
+    ],
+)
+def test_parse_expression_candidates(field, expected):
+    assert parse_expression_candidates(field) == expected
@@ -0,0 +1,21 @@
+from japanese_pitch_accent.util import get_acc_patt
+
+acc_dict = {
+    "行く": [("いく", "HhHh")],
+    "食べ物": [("たべもの", "HhLlLlLl")],
+    "人": [("ひと", "HhLl")],
+}
+
+
+def test_get_acc_patt():
+    assert get_acc_patt("食[た]べ 物[もの]", "", [acc_dict]) == ("たべもの", "HhLlLlLl")
+
+
+def test_get_acc_patt_first_word():
+    # joined expression isn’t in the dictionary, first word is
+    assert get_acc_patt("行[い]く 人[ひと] です", "", [acc_dict]) == ("いく", "HhHh")
+
+
+def test_get_acc_patt_not_found():
+    assert get_acc_patt("猫[ねこ]", "", [acc_dict]) is None
+    assert get_acc_patt("cat", "", [acc_dict]) is None
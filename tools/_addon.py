@@ -0,0 +1,34 @@
+"""Import the add-on (src/) outside of Anki.
+
+The package’s __init__.py sets up Anki’s GUI, so the package is
+registered without running it. Modules that do not depend on Anki
+(e.g. draw_pitch, accent_dict, wadoku_parse) can then be imported
+as usual. Modules importing aqt/anki (e.g. util) can be imported after
+use_anki_stubs().
+"""
+
+import os
+import sys
+import types
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDON_DIR = os.path.join(os.path.dirname(TOOLS_DIR), "src")
+STUBS_DIR = os.path.join(TOOLS_DIR, "stubs")
+PACKAGE = "japanese_pitch_accent"
+
+
+def load_addon() -> types.ModuleType:
+    """Register and return the add-on package."""
+
+    if PACKAGE not in sys.modules:
+        pkg = types.ModuleType(PACKAGE)
+        pkg.__path__ = [ADDON_DIR]
+        sys.modules[PACKAGE] = pkg
+    return sys.modules[PACKAGE]
+
+
+def use_anki_stubs() -> None:
+    """Make the stand-ins for aqt and anki in tools/stubs importable."""
+
+    if STUBS_DIR not in sys.path:
+        sys.path.insert(0, STUBS_DIR)
@@ -0,0 +1,290 @@
+"""Micro-benchmarks of the add-on’s rendering and text processing
+functions, with a performance regression check against a stored
+baseline.
+
+usage: python3 tools/bench.py [--save] [--threshold 1.5] [-k <kernel>]
+
+Runs outside of Anki (aqt/anki are replaced by the stand-ins in
+tools/stubs). Each kernel processes a fixed corpus; the best of several
+runs is reported per corpus item. To make baselines comparable across
+machines, times are also stored relative to a fixed pure Python
+calibration workload, and it is this relative time that is checked.
+Exits with status 1 if a kernel is slower than its baseline by more
+than the threshold factor.
+
+A change that makes a kernel slower on purpose updates that kernel’s
+baseline in the same commit, with the reason in the commit message.
+Don’t re-save the whole baseline for it, so that the other kernels are
+still checked against their previous cost.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+from importlib import import_module
+from _addon import load_addon, use_anki_stubs, PACKAGE, TOOLS_DIR
+
+use_anki_stubs()
+load_addon()
+accent_dict = import_module(f"{PACKAGE}.accent_dict")
+draw_pitch = import_module(f"{PACKAGE}.draw_pitch")
+furigana = import_module(f"{PACKAGE}.furigana")
+util = import_module(f"{PACKAGE}.util")
+
+BASELINE_PATH = os.path.join(TOOLS_DIR, "bench_baseline.json")
+
+# (kana, mora level pattern incl. following particle)
+# fmt: off
+WORDS = [
+    ("はし", "HLL"), ("はし", "LHL"), ("はし", "LHH"), ("しゅん", "LHH"),
+    ("しゅんかしゅうとう", "LHHHHHHH"), ("ちゃわん", "LHHH"),
+    ("じゅぎょう", "HLLL"), ("ことば", "LHHL"), ("あたらしい", "LHHHLL"),
+    ("きょうりゅう", "LHHHH"), ("がっこう", "LHHHH"), ("トマト", "LHLL"),
+    ("コーヒー", "LHHLL"), ("りんご", "LHHH"), ("にほんご", "LHHHH"),
+    ("おかあさん", "LHLLLL"), ("しょくどう", "LHHHH"), ("きって", "LHHL"),
+    ("ぎゅうにゅう", "LHHHH"), ("ひゃく", "HLL"),
+]
+# fmt: on
+
+# note field contents (expression, reading) as found on cards
+FIELDS = [
+    ("橋", "はし"),
+    ("<b>箸</b>", "はし"),
+    ("端 (はし)", "はし"),
+    ("旬<br>", "しゅん"),
+    ('<div class="expr">春夏秋冬</div>', "しゅんかしゅうとう"),
+    ("茶碗&nbsp;", "ちゃわん"),
+    ("<span style='color: red'>授業</span>", "じゅぎょう"),
+    ("言葉[ことば]", "ことば"),
+    ("新しい（あたらしい）", "あたらしい"),
+    ("恐竜 <img src='dino.jpg'>", "きょうりゅう"),
+    ("学校", "がっこう"),
+    ("<!-- comment -->トマト", "トマト"),
+    ("珈琲", "コーヒー"),
+    ("林檎︎", "りんご"),
+    ("日本語 - Japanese", "にほんご"),
+    ("お母さん", "おかあさん"),
+    ("食堂", "しょくどう"),
+    ("切手", "きって"),
+    ("牛乳", "ぎゅうにゅう"),
+    ("百", "ひゃく"),
+    ("English only", ""),
+    ("存在しない言葉", "そんざいしないことば"),
+]
+
+# dictionary entries (expression, reading, character level pattern)
+ENTRIES = [
+    ("橋", "はし", "LHL"),
+    ("箸", "はし", "HLL"),
+    ("端", "はし", "LHH"),
+    ("旬", "しゅん", "LlHH"),
+    ("春夏秋冬", "しゅんかしゅうとう", "LlHHHhHHH"),
+    ("茶碗", "ちゃわん", "LlHHH"),
+    ("授業", "じゅぎょう", "HhLlLL"),
+    ("言葉", "ことば", "LHHL"),
+    ("新しい", "あたらしい", "LHHHLL"),
+    ("恐竜", "きょうりゅう", "LlHHhHH"),
+    ("学校", "がっこう", "LHHHH"),
+    ("トマト", "トマト", "LHLL"),
+    ("珈琲", "コーヒー", "LHHLL"),
+    ("林檎", "りんご", "LHHH"),
+    ("日本語", "にほんご", "LHHHH"),
+    ("お母さん", "おかあさん", "LHLLLL"),
+    ("食堂", "しょくどう", "LlHHHH"),
+    ("切手", "きって", "LHHL"),
+    ("牛乳", "ぎゅうにゅう", "LlHHhHH"),
+    ("百", "ひゃく", "HhLL"),
+]
+
+CHAR_PATTS = [patt for _, _, patt in ENTRIES]
+
+# expression fields in furigana/ruby notation (reading in the same field)
+FURIGANA_FIELDS = [
+    " 橋[はし]",
+    "<b> 箸[はし]</b>",
+    " 春夏秋冬[しゅんかしゅうとう]<br>[sound:shunkashuutou.mp3]",
+    " 茶碗[ちゃわん]&nbsp;",
+    " 新[あたら]しい",
+    " 食[た]べ 物[もの]",
+    " 言葉[ことば];LHHL",
+    "<ruby>恐竜<rt>きょうりゅう</rt></ruby>",
+    "<ruby>授業<rp>(</rp><rt>じゅぎょう</rt><rp>)</rp></ruby>",
+    "<ruby>橋<rt>はし</rt></ruby>を 渡[わた]る",
+    "トマト",
+    " お 母[かあ]さん",
+]
+
+FIELD_CONTENTS = ["", "橋", "<b>箸</b>", "言葉[ことば]<br>word", "x" * 500]
+
+
+def kernel_pitch_svg():
+    for kana, patt in WORDS:
+        draw_pitch.pitch_svg(kana, patt)
+
+
+def kernel_pitch_svg_compact():
+    for kana, patt in WORDS:
+        draw_pitch.pitch_svg(kana, patt, compact=True)
+
+
+def kernel_hira_to_mora():
+    for kana, _ in WORDS:
+        draw_pitch.hira_to_mora(kana)
+
+
+def kernel_clean_japanese_from_note_field():
+    for expr, _ in FIELDS:
+        util.clean_japanese_from_note_field(expr)
+
+
+def kernel_parse_expression_field():
+    for field in FURIGANA_FIELDS:
+        furigana.parse_expression_field(field)
+
+
+acc_dict = accent_dict.CompactAccentDict.build(ENTRIES)
+
+
+def kernel_get_acc_patt():
+    for expr, reading in FIELDS:
+        util.get_acc_patt(expr, reading, [acc_dict])
+
+
+def kernel_char_lvl_patt_to_mora_lvl_patt():
+    for patt in CHAR_PATTS:
+        util.char_lvl_patt_to_mora_lvl_patt(patt)
+
+
+svg = draw_pitch.pitch_svg("しゅんかしゅうとう", "LHHHHHHH")
+
+
+def kernel_add_pitch_to_field_content():
+    for content in FIELD_CONTENTS:
+        util.add_pitch_to_field_content(content, svg, False, "0123abcd")
+
+
+# name -> (function, number of corpus items processed per call)
+KERNELS = {
+    "pitch_svg": (kernel_pitch_svg, len(WORDS)),
+    "pitch_svg_compact": (kernel_pitch_svg_compact, len(WORDS)),
+    "hira_to_mora": (kernel_hira_to_mora, len(WORDS)),
+    "clean_japanese_from_note_field": (
+        kernel_clean_japanese_from_note_field,
+        len(FIELDS),
+    ),
+    "parse_expression_field": (
+        kernel_parse_expression_field,
+        len(FURIGANA_FIELDS),
+    ),
+    "get_acc_patt": (kernel_get_acc_patt, len(FIELDS)),
+    "char_lvl_patt_to_mora_lvl_patt": (
+        kernel_char_lvl_patt_to_mora_lvl_patt,
+        len(CHAR_PATTS),
+    ),
+    "add_pitch_to_field_content": (
+        kernel_add_pitch_to_field_content,
+        len(FIELD_CONTENTS),
+    ),
+}
+
+
+def calibration():
+    """Fixed pure Python workload (string building, dict and list use)
+    that times are normalized by.
+    """
+
+    d = {}
+    for i in range(200):
+        s = f"{i}-{i * 7}"
+        d[s] = [ch for ch in s if ch != "-"]
+    return "".join(k for k in d if len(d[k]) > 3)
+
+
+def measure(func, repeat: int) -> float:
+    """Best time of a single call of func in seconds."""
+
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--save", action="store_true", help="store the results as new baseline"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.5,
+        help="maximum allowed slowdown factor (default: 1.5)",
+    )
+    parser.add_argument(
+        "-k",
+        dest="kernels",
+        action="append",
+        choices=sorted(KERNELS),
+        help="only run the given kernel (can be repeated)",
+    )
+    parser.add_argument("--repeat", type=int, default=7, help="runs per kernel")
+    args = parser.parse_args()
+
+    baseline = None
+    if not args.save and os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf8") as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    calibs = []
+    print(f"{'kernel':32} {'µs/item':>9} {'relative':>9} {'baseline':>9}")
+    for name in args.kernels or KERNELS:
+        func, num_items = KERNELS[name]
+        # calibrated right before and after every kernel, as the load
+        # of the machine may vary during the run
+        calib = measure(calibration, args.repeat)
+        t = measure(func, args.repeat)
+        calib = min(calib, measure(calibration, args.repeat))
+        calibs.append(calib)
+        rel = t / calib
+        results[name] = {"us_per_item": t / num_items * 1e6, "relative": rel}
+        line = f"{name:32} {t / num_items * 1e6:9.2f} {rel:9.4f}"
+        base = baseline["kernels"].get(name) if baseline else None
+        if base is not None:
+            factor = rel / base["relative"]
+            line += f" {base['relative']:9.4f} ({factor:.2f}x)"
+            if factor > args.threshold:
+                regressions.append(name)
+                line += " REGRESSION"
+        print(line)
+
+    if args.save:
+        with open(BASELINE_PATH, "w", encoding="utf8") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "calibration_us": min(calibs) * 1e6,
+                    "kernels": results,
+                },
+                f,
+                indent=2,
+            )
+            f.write("\n")
+        print(f"baseline written to {BASELINE_PATH}")
+    elif baseline is None:
+        print("no baseline found (create one with --save)")
+
+    if regressions:
+        print(
+            f"{len(regressions)} kernel(s) slower than baseline by more than "
+            f"{args.threshold}x: {', '.join(regressions)}",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Precompile the pitch accent database into the binary format the
+add-on loads at runtime (see util.load_accent_dict), or verify that a
+precompiled file gives the same lookups as the CSV.
+
+usage: python3 tools/compile_dict.py [--verify] [<wadoku_pitchdb.csv>]
+                                     [<wadoku_pitchdb.pitchdict>]
+"""
+
+import argparse
+import os
+import sys
+import time
+from importlib import import_module
+from _addon import load_addon, use_anki_stubs, PACKAGE
+
+use_anki_stubs()
+load_addon()
+accent_dict = import_module(f"{PACKAGE}.accent_dict")
+util = import_module(f"{PACKAGE}.util")
+
+
+def compile_dict(csv_path: str, out_path: str) -> None:
+    start = time.perf_counter()
+    acc_dict = accent_dict.CompactAccentDict.build(
+        util.read_accent_dict_entries(csv_path)
+    )
+    write_compiled_dict(acc_dict, out_path)
+    print(
+        f"wrote {len(acc_dict)} expressions to {out_path}"
+        f" in {time.perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
+
+
+def write_compiled_dict(acc_dict, out_path: str) -> None:
+    """Write a dict in the precompiled format, keyed like the one the
+    add-on loads.
+    """
+
+    with open(f"{out_path}.tmp", "wb") as f:
+        acc_dict.dump(f, util.dict_artifact_key())
+    os.replace(f"{out_path}.tmp", out_path)
+
+
+def verify_dict(csv_path: str, compiled_path: str) -> list[str]:
+    """Compare all lookups (by expression and by reading) of the
+    precompiled dict with those of the dict built from the CSV. Returns
+    descriptions of the differences.
+    """
+
+    compiled = util.load_compiled_accent_dict(compiled_path, util.dict_artifact_key())
+    if compiled is None:
+        return [f"{compiled_path} is missing or of another (format) version"]
+    built = accent_dict.CompactAccentDict.build(util.read_accent_dict_entries(csv_path))
+
+    errors = []
+    if len(compiled) != len(built):
+        errors.append(f"{len(compiled)} expressions instead of {len(built)}")
+    for orth, patts in built.items():
+        if compiled.get(orth) != patts:
+            errors.append(f"{orth}: {compiled.get(orth)} instead of {patts}")
+    readings = {reading for patts in built.values() for reading, _ in patts}
+    for reading in readings:
+        if compiled.lookup_reading(reading) != built.lookup_reading(reading):
+            errors.append(f"reading {reading}: differing patterns")
+    return errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="check an existing precompiled file instead of writing it",
+    )
+    parser.add_argument(
+        "csv_path",
+        nargs="?",
+        default="src/wadoku_pitchdb.csv",
+        help="pitch accent database (default: src/wadoku_pitchdb.csv)",
+    )
+    parser.add_argument(
+        "out_path",
+        nargs="?",
+        default=f"src/{util.dict_artifact_fn}",
+        help=f"precompiled file (default: src/{util.dict_artifact_fn})",
+    )
+    args = parser.parse_args()
+
+    if not args.verify:
+        compile_dict(args.csv_path, args.out_path)
+        return
+    errors = verify_dict(args.csv_path, args.out_path)
+    for error in errors[:20]:
+        print(error, file=sys.stderr)
+    if errors:
+        print(f"{args.out_path}: {len(errors)} difference(s)", file=sys.stderr)
+        sys.exit(1)
+    print(f"{args.out_path}: lookups identical to {args.csv_path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""Stand-in for anki.cards."""
+
+CardId = int
@@ -0,0 +1,4 @@
+"""Stand-in for anki.models."""
+
+NotetypeId = int
+NotetypeDict = dict
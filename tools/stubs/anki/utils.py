@@ -0,0 +1,21 @@
+"""Stand-in for anki.utils (same behaviour as Anki’s versions)."""
+
+import html
+import re
+
+_re_comment = re.compile(r"(?s)<!--.*?-->")
+_re_style = re.compile(r"(?si)<style.*?>.*?</style>")
+_re_script = re.compile(r"(?si)<script.*?>.*?</script>")
+_re_tag = re.compile(r"(?s)<.*?>")
+
+
+def strip_html(txt: str) -> str:
+    txt = _re_comment.sub("", txt)
+    txt = _re_style.sub("", txt)
+    txt = _re_script.sub("", txt)
+    txt = _re_tag.sub("", txt)
+    return html.unescape(txt).replace("\xa0", " ").strip()
+
+
+def ids2str(ids) -> str:
+    return "(%s)" % ",".join(str(i) for i in ids)
@@ -0,0 +1,4 @@
+"""Stand-in for aqt (no main window outside of Anki)."""
+
+mw = None
+gui_hooks = None
@@ -0,0 +1,14 @@
+"""Stand-in for aqt.qt."""
+
+
+class _QtStub:
+    def __init__(self, *args, **kwargs):
+        raise RuntimeError("Qt is not available outside of Anki")
+
+
+class Qt:
+    pass
+
+
+QDialog = QDialogButtonBox = QLabel = QLineEdit = QListWidget = _QtStub
+QMenu = QTimer = QVBoxLayout = QAction = _QtStub
@@ -0,0 +1,17 @@
+"""Stand-in for aqt.utils."""
+
+from .qt import (  # noqa: F401
+    Qt,
+    QDialog,
+    QDialogButtonBox,
+    QLabel,
+    QListWidget,
+    QVBoxLayout,
+)
+
+
+def _gui_only(*args, **kwargs):
+    raise RuntimeError("GUI is not available outside of Anki")
+
+
+showInfo = showText = showWarning = askUser = tooltip = _gui_only
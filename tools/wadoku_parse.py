@@ -0,0 +1,85 @@
+"""Convert a Wadoku XML dump into the add-on’s pitch accent database.
+
+usage: python3 tools/wadoku_parse.py [--pitchdict [<wadoku_pitchdb.pitchdict>]]
+                                     <wadoku.xml> [<wadoku_pitchdb.csv>]
+
+With --pitchdict, the precompiled database the add-on ships is built in
+the same pass (as tools/compile_dict.py would build it from the CSV).
+"""
+
+import argparse
+import sys
+import time
+from importlib import import_module
+from _addon import load_addon, PACKAGE
+from compile_dict import accent_dict, util, write_compiled_dict
+
+load_addon()
+wadoku_parse = import_module(f"{PACKAGE}.wadoku_parse")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("xml_path", help="Wadoku XML dump")
+    parser.add_argument(
+        "out_path",
+        nargs="?",
+        default="src/wadoku_pitchdb.csv",
+        help="output file (default: src/wadoku_pitchdb.csv)",
+    )
+    parser.add_argument(
+        "--pitchdict",
+        nargs="?",
+        const=f"src/{util.dict_artifact_fn}",
+        metavar="PITCHDICT_PATH",
+        help=f"also write the precompiled file (default: src/{util.dict_artifact_fn})",
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+
+    def progress(num_entries: int, bytes_read: int, total: int) -> None:
+        pct = 100 * bytes_read / total if total else 0
+        rate = num_entries / max(time.perf_counter() - start, 1e-9)
+        print(
+            f"\r{num_entries} entries ({pct:.1f}%, {rate:.0f} entries/s)",
+            end="",
+            file=sys.stderr,
+        )
+
+    if args.pitchdict is None:
+        with open(args.out_path, "w", encoding="utf8") as out_file:
+            num_lines = wadoku_parse.convert(args.xml_path, out_file, progress)
+    else:
+        num_lines = 0
+
+        def written_lines(lines, out_file):
+            nonlocal num_lines
+            for line in lines:
+                out_file.write(f"{line}\n")
+                num_lines += 1
+                yield line
+
+        with (
+            open(args.xml_path, "rb") as xml_file,
+            open(args.out_path, "w", encoding="utf8") as out_file,
+        ):
+            lines = wadoku_parse.iter_pitchdb_lines(xml_file, progress)
+            acc_dict = accent_dict.CompactAccentDict.build(
+                util.accent_dict_entries(written_lines(lines, out_file))
+            )
+        write_compiled_dict(acc_dict, args.pitchdict)
+        print(
+            f"\nwrote {len(acc_dict)} expressions to {args.pitchdict}",
+            end="",
+            file=sys.stderr,
+        )
+    print(
+        f"\nwrote {num_lines} lines to {args.out_path}"
+        f" in {time.perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()